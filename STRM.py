@@ -3,26 +3,72 @@ Monte Carlo Investment Simulator - Bootstrap Theme Version
 Main Application with Bootstrap-style CSS
 """
 
+import copy
+import importlib
+import importlib.util
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait
+import numpy as np
 import streamlit as st
 from config_manager import ConfigManager
 from simulation_engine import MonteCarloSimulator
+from simulation_kernels import SimulationCancelled, warm_up
 from ui_components import UIComponents
 from results_display import ResultsDisplay
 from portfolio_manager import PortfolioManager
-from translations import get_text  # Usa la versione professionale
+from translations import get_text, get_scenario_names  # Usa la versione professionale
 
-# Import optional correlation modules if available
-try:
-    from enhanced_config_manager import EnhancedConfigManager
-    from correlation_engine import CorrelatedMonteCarloSimulator
-    from correlation_ui import CorrelationUIComponents
-    CORRELATION_AVAILABLE = True
-except ImportError:
-    CORRELATION_AVAILABLE = False
+logger = logging.getLogger(__name__)
 
-def load_css():
-    """Load professional Bootstrap-style CSS"""
-    css = """
+# Optional correlation modules, imported lazily on first use
+_CORRELATION_EXPORTS = {
+    'EnhancedConfigManager': 'enhanced_config_manager',
+    'CorrelatedMonteCarloSimulator': 'correlation_engine',
+    'CorrelationUIComponents': 'correlation_ui',
+}
+_correlation_cache = {}
+
+# Correlation scenarios offered in the sidebar (labels live in translations.SCENARIO_NAMES)
+_CORRELATION_SCENARIOS = ('normal_times', 'crisis_times', 'independent', 'defensive', 'high_inflation')
+
+@st.cache_resource(show_spinner=False)
+def _correlation_available():
+    """
+    Check whether the optional correlation modules exist without importing them
+    
+    Cached per process: this script (and _correlation_cache with it) is re-executed
+    on every rerun, and until the modules are imported find_spec scans sys.path.
+    """
+    return all(
+        importlib.util.find_spec(module) is not None
+        for module in set(_CORRELATION_EXPORTS.values())
+    )
+
+def _load_correlation_modules(*names):
+    """Import the requested correlation classes on demand and memoize them"""
+    names = names or tuple(_CORRELATION_EXPORTS)
+    for name in names:
+        if name not in _correlation_cache:
+            module = importlib.import_module(_CORRELATION_EXPORTS[name])
+            _correlation_cache[name] = getattr(module, name)
+    if len(names) == 1:
+        return _correlation_cache[names[0]]
+    return tuple(_correlation_cache[name] for name in names)
+
+def __getattr__(name):
+    """Resolve the optional correlation names lazily (PEP 562)"""
+    if name == 'CORRELATION_AVAILABLE':
+        return _correlation_available()
+    if name in _CORRELATION_EXPORTS:
+        try:
+            return _load_correlation_modules(name)
+        except ImportError as e:
+            raise AttributeError(name) from e
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+# Professional Bootstrap-style theme, injected on every run
+_CSS = """
     <style>
     /* Professional Bootstrap-inspired Theme */
     :root {
@@ -152,103 +198,430 @@ def load_css():
     }
     </style>
     """
-    st.markdown(css, unsafe_allow_html=True)
 
-def main():
-    """Main application function with professional theme"""
-    # Initialize session state
+def load_css():
+    """Load professional Bootstrap-style CSS"""
+    st.markdown(_CSS, unsafe_allow_html=True)
+
+class _ThrottledProgress:
+    """Progress bar and status text wrapper that forwards at most max_updates redraws"""
+
+    def __init__(self, bar, total, status=None, max_updates=20):
+        self.bar = bar
+        self.status = status
+        self.total = max(int(total), 1)
+        self.stride = max(self.total // max_updates, 1)
+        self.last_step = -1
+        self.forwarded = False
+
+    def progress(self, value):
+        """Same signature as st.progress; redraws only once per stride and at completion"""
+        step = min(int(value * self.total), self.total)
+        # The poll loop re-reports the same value every tick; only a new step is redrawn
+        self.forwarded = step > self.last_step and (step == self.total or step - self.last_step >= self.stride)
+        if self.forwarded:
+            self.last_step = step
+            self.bar.progress(min(float(value), 1.0))
+
+    def text(self, message):
+        """Same signature as st.empty().text; only follows a redrawn progress value or completion"""
+        if self.status is not None and (self.forwarded or self.last_step == self.total):
+            self.status.text(message)
+
+class _ProgressRecorder:
+    """
+    Stand-in progress bar/status for the worker thread; the script thread polls it
+    
+    Setting cancel_event stops the run at the next path batch (see run_chunked).
+    """
+
+    def __init__(self):
+        self.value = 0.0
+        self.message = ''
+        self.cancel_event = threading.Event()
+
+    def progress(self, value):
+        self.value = value
+
+    def text(self, message):
+        self.message = message
+
+@st.cache_resource(show_spinner=False)
+def _get_executor():
+    """
+    Single worker thread shared by every session, so runs never block the script thread
+    
+    Runs are serialized process-wide: each kernel batch already uses every core, so a
+    second worker would only split them. An interrupted script run cancels its own run
+    (see main), so the queue only ever holds runs someone is still waiting for.
+    """
+    executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='simulation')
+    # Compile the kernels in the background; a first run simply queues behind it
+    executor.submit(warm_up)
+    return executor
+
+@st.cache_resource(show_spinner=False)
+def _get_config_manager(enhanced):
+    """Build the config manager once per process, falling back to the legacy one"""
+    if enhanced:
+        try:
+            EnhancedConfigManager = _load_correlation_modules('EnhancedConfigManager')
+            return EnhancedConfigManager(), True
+        except Exception as e:
+            logger.warning("Enhanced config manager failed, using legacy: %s", e)
+        st.warning("Enhanced config manager failed, using legacy")
+    return ConfigManager(), False
+
+@st.cache_resource(show_spinner=False)
+def _get_simulator(correlated, scenario=None, _config_manager=None):
+    """Build one simulator per (engine, correlation scenario), falling back to the standard one"""
+    if correlated:
+        try:
+            CorrelatedMonteCarloSimulator = _load_correlation_modules('CorrelatedMonteCarloSimulator')
+            simulator = CorrelatedMonteCarloSimulator()
+            _apply_correlation_scenario(simulator, _config_manager, scenario)
+            return simulator, True
+        except Exception as e:
+            logger.warning("Correlation simulator failed, using standard: %s", e)
+        st.warning("Correlation simulator failed, using standard")
+    return MonteCarloSimulator(), False
+
+def _apply_correlation_scenario(simulator, config_manager, scenario):
+    """
+    Load a configured scenario over every config asset
+    
+    set_correlation_matrix factors the matrix while validating it, and _get_simulator
+    keeps one simulator per scenario, so each scenario's Cholesky factor is computed once.
+    """
+    config_matrix = getattr(config_manager, 'correlation_matrix', None)
+    if not scenario or not config_matrix:
+        return
+    
+    asset_names = config_matrix['assets']
+    matrix = config_manager.get_correlation_matrix_for_assets(asset_names, scenario)
+    if matrix is None:
+        return
+    
+    simulator.set_correlation_matrix(asset_names, matrix)
+
+@st.cache_data(show_spinner=False)
+def _sanitize_corr(matrix_bytes, shape):
+    """Project a correlation matrix onto the nearest PSD one once per distinct matrix"""
+    matrix = np.frombuffer(matrix_bytes).reshape(shape)
+    matrix = (matrix + matrix.T) / 2
+    eigenvals, eigenvecs = np.linalg.eigh(matrix)
+    if eigenvals.min() >= 1e-10:
+        return matrix.tobytes()
+    
+    # Clip rounding-level negative eigenvalues and restore the unit diagonal
+    eigenvals = np.clip(eigenvals, 1e-10, None)
+    projected = (eigenvecs * eigenvals) @ eigenvecs.T
+    diag_sqrt = np.sqrt(np.diag(projected))
+    projected /= np.outer(diag_sqrt, diag_sqrt)
+    return projected.tobytes()
+
+def _assets_key(packed):
+    """Hashable fingerprint of a packed portfolio for the simulation cache"""
+    return tuple(packed['names']), packed['field_block'].tobytes()
+
+def _correlation_key(simulator):
+    """Hashable fingerprint of the simulator's configured correlation matrix, if any"""
+    matrix = getattr(simulator, 'correlation_matrix', None)
+    if matrix is None:
+        return None
+    return tuple(simulator.correlation_assets or ()), np.asarray(matrix).tobytes()
+
+def _simulate(simulator, accumulation, retirement, params, n_sims, progress, lang, rng):
+    """Run one simulation with the sidebar parameters"""
+    return simulator.run_simulation(
+        accumulation,
+        retirement,
+        params['initial_amount'],
+        params['years_to_retirement'],
+        params['years_retired'],
+        params['annual_contribution'],
+        params['adjust_contribution_inflation'],
+        params['inflation'] / 100,
+        params['withdrawal'],
+        params['capital_gains_tax_rate'],
+        n_sims,
+        params['use_real_withdrawal'],
+        progress,
+        progress,
+        lang,
+        rng
+    )
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def _cached_simulate(method, accum_key, retire_key, params_key, corr_key, n_sims,
+                     _simulator, _accumulation, _retirement, _progress, _lang, _rng):
+    """Run a simulation once per distinct set of inputs; only the key arguments are hashed"""
+    return _simulate(_simulator, _accumulation, _retirement, dict(params_key), n_sims,
+                     _progress, _lang, _rng)
+
+def _run_instance(simulator):
+    """
+    Per-run shallow copy of a shared _get_simulator instance
+    
+    run_simulation stores its results (and the correlated engine memoizes phase loadings)
+    on the simulator, so runs write to the copy and never to the object every session holds.
+    """
+    instance = copy.copy(simulator)
+    if hasattr(instance, '_loadings_cache'):
+        instance._loadings_cache = dict(instance._loadings_cache)
+    return instance
+
+def _run(simulator, correlated, params, accumulation, retirement, progress, lang, rng, correlation=None):
+    """
+    Single dispatch point for a simulation run
+    
+    correlated is the flag _get_simulator returned alongside the simulator. Returns (method, simulator used, results); a failed correlated run is retried
+    once on the standard engine. The simulator used is a per-run copy, see _run_instance;
+    correlation is this session's (assets, matrix) override from the advanced settings.
+    """
+    simulator = _run_instance(simulator)
+    keys = (_assets_key(accumulation), _assets_key(retirement), tuple(sorted(params.items())))
+    
+    def simulate(method, simulator, corr_key):
+        # Seed 0 asks for fresh draws on every run, so it bypasses the results cache
+        if not params['seed']:
+            return _simulate(simulator, accumulation, retirement, params, params['n_simulations'],
+                             progress, lang, rng)
+        return _cached_simulate(method, *keys, corr_key, params['n_simulations'],
+                                simulator, accumulation, retirement, progress, lang, rng)
+    
+    if correlated:
+        try:
+            if correlation is not None:
+                simulator.set_correlation_matrix(*correlation)
+            return 'correlation', simulator, simulate('correlation', simulator, _correlation_key(simulator))
+        except SimulationCancelled:
+            raise
+        except Exception:
+            simulator = MonteCarloSimulator()
+    return 'standard', simulator, simulate('standard', simulator, None)
+
+def _reset_correlation_override():
+    """Drop the advanced-settings matrix; runs go back to the sidebar scenario's one"""
+    st.session_state.correlation_override = None
+    st.session_state.use_settings_correlation = False
+    # The settings selector starts over on the sidebar scenario next time it renders
+    st.session_state.pop('correlation_settings_scenario', None)
+
+def _use_settings_correlation():
+    """The user picked a scenario in the advanced settings: apply its matrix from now on"""
+    st.session_state.use_settings_correlation = True
+
+@st.fragment
+def _correlation_settings_fragment(config_manager, simulator, lang):
+    """Render the advanced correlation settings; widget changes only rerun this fragment"""
+    CorrelationUIComponents = _load_correlation_modules('CorrelationUIComponents')
+    
+    with st.expander("🔗 " + get_text('correlation_settings', lang),
+                     expanded=True):
+        scenario, correlation_matrix = CorrelationUIComponents.render_correlation_settings(
+            config_manager, lang, st.session_state.correlation_scenario, _use_settings_correlation
+        )
+        asset_names = config_manager.asset_names
+        
+        try:
+            correlation_matrix = np.ascontiguousarray(correlation_matrix, dtype=np.float64)
+            correlation_matrix = np.frombuffer(
+                _sanitize_corr(correlation_matrix.tobytes(), correlation_matrix.shape)
+            ).reshape(correlation_matrix.shape)
+            # Validate on a per-run copy; the shared simulator keeps its scenario matrix
+            preview = _run_instance(simulator)
+            preview.set_correlation_matrix(asset_names, correlation_matrix)
+        except ValueError as e:
+            st.error(f"Invalid correlation matrix: {str(e)}")
+            return
+        
+        # Only a scenario the user picked here overrides the sidebar one; _run applies it to
+        # this session's runs until Close or a sidebar scenario change resets it
+        if st.session_state.use_settings_correlation:
+            st.session_state.correlation_override = {
+                'scenario': scenario,
+                'assets': tuple(asset_names),
+                'matrix': correlation_matrix
+            }
+            applied = preview
+        else:
+            applied = simulator if simulator.get_correlation_matrix() is not None else preview
+        
+        CorrelationUIComponents.render_correlation_visualization(
+            applied.get_correlation_matrix(), asset_names, lang
+        )
+        CorrelationUIComponents.render_correlation_impact_analysis(lang)
+        
+        if st.button(get_text('close', lang), key='close_correlation_settings'):
+            st.session_state.show_correlation_settings = False
+            _reset_correlation_override()
+            st.rerun()
+
+def _initialize_session_state():
+    """Portfolio, correlation-control and Generator session defaults in one pass"""
     PortfolioManager.initialize_session_state()
+    for key, value in (('use_correlation', False),
+                       ('correlation_scenario', 'normal_times'),
+                       ('show_correlation_settings', False),
+                       ('correlation_override', None),
+                       ('use_settings_correlation', False)):
+        st.session_state.setdefault(key, value)
+    if 'rng' not in st.session_state:
+        # One seeded generator per session: reproducible first run, fresh draws afterwards.
+        # Kept in session state rather than st.cache_resource, which would share a single
+        # (not thread-safe) Generator and one draw sequence between every session
+        st.session_state.rng = np.random.default_rng(seed=12345)
+
+def _render_portfolio(phase, assets, lang, mirror_retirement=False):
+    """
+    Editor, allocation controls, chart and summary for one phase's portfolio
+    
+    mirror_retirement copies accumulation edits into the retirement phase
+    (same-portfolio mode). Returns the phase's asset list as left by this rerun.
+    """
+    st.subheader(get_text(f'{phase}_portfolio', lang))
+    
+    if not assets:
+        st.warning(get_text('select_profile', lang))
+        return assets
+    
+    assets_key = f'current_{phase}_assets'
+    updated_assets = UIComponents.render_asset_editor(assets, lang, phase)
+    st.session_state[assets_key] = updated_assets
+    
+    # Re-copy into the retirement phase only when an edit actually changed something
+    if mirror_retirement and st.session_state.current_retirement_assets != updated_assets:
+        st.session_state.current_retirement_assets = [asset.copy() for asset in updated_assets]
+    
+    reset_clicked, balance_clicked = UIComponents.render_allocation_controls(lang, phase)
+    
+    if reset_clicked:
+        PortfolioManager.reset_allocations(phase)
+    
+    if balance_clicked:
+        PortfolioManager.balance_allocations(phase)
+    
+    assets = st.session_state[assets_key]
+    total_allocation = PortfolioManager.get_total_allocation(assets)
+    UIComponents.render_allocation_status(total_allocation, lang)
+    UIComponents.render_allocation_chart(assets, lang, phase, total_allocation)
+    UIComponents.render_asset_summary(assets, lang, phase)
+    return assets
+
+@st.fragment
+def _portfolio_editor_fragment(use_same_portfolio, lang):
+    """
+    Portfolio editors for both phases, rerun on their own when an asset is edited
+    
+    Each phase's assets are read from session state once; on full reruns the edited
+    lists are returned for the run below.
+    """
+    if use_same_portfolio:
+        final_accumulation_assets = _render_portfolio(
+            'accumulation', st.session_state.current_accumulation_assets, lang, mirror_retirement=True
+        )
+        return final_accumulation_assets, st.session_state.current_retirement_assets
+    
+    col1, col2 = st.columns(2)
+    
+    with col1:
+        final_accumulation_assets = _render_portfolio(
+            'accumulation', st.session_state.current_accumulation_assets, lang
+        )
+    
+    with col2:
+        final_retirement_assets = _render_portfolio(
+            'retirement', st.session_state.current_retirement_assets, lang
+        )
+    return final_accumulation_assets, final_retirement_assets
+
+def _render_preamble():
+    """Session defaults, CSS, page configuration and language selector; returns the language"""
+    # Initialize session state
+    _initialize_session_state()
     
     # Load professional CSS
     load_css()
     
-    # Initialize correlation settings
-    if 'use_correlation' not in st.session_state:
-        st.session_state.use_correlation = False
-    if 'correlation_scenario' not in st.session_state:
-        st.session_state.correlation_scenario = 'normal_times'
-    if 'show_correlation_settings' not in st.session_state:
-        st.session_state.show_correlation_settings = False
-    
     lang = st.session_state.language
     
-    # Page configuration
-    st.set_page_config(
-        page_title=get_text('page_title', lang),
-        page_icon="📊",  # Usa un'icona neutra invece di emoticon
-        layout="wide",
-        initial_sidebar_state="expanded"
-    )
+    # Page configuration (the browser keeps it across reruns; resend only when the language changes)
+    if st.session_state.get('page_configured_lang') != lang:
+        st.set_page_config(
+            page_title=get_text('page_title', lang),
+            page_icon="📊",  # Usa un'icona neutra invece di emoticon
+            layout="wide",
+            initial_sidebar_state="expanded"
+        )
+        st.session_state.page_configured_lang = lang
     
     # Language selector
     UIComponents.render_language_selector(lang)
+    return lang
+
+def _render_header(lang):
+    """Title, disclaimers and feature announcements above the parameters"""
+    # Main header
+    st.title(get_text('main_title', lang))
+    
+    # Enhanced disclaimers section
+    UIComponents.render_disclaimers(lang)
+    
+    # Feature announcements
+    st.info(f"**{get_text('new_features', lang)}**: {get_text('new_features_text', lang)}")
+    
+    st.success(f"**{get_text('risk_analysis', lang)}**: {get_text('risk_analysis_text', lang)}")
+    
+    st.markdown("---")
+
+def main():
+    """Main application function with professional theme"""
+    lang = _render_preamble()
     
-    # Initialize config manager
+    # Initialize config manager (built once per process, see _get_config_manager)
     try:
-        if CORRELATION_AVAILABLE:
-            try:
-                config_manager = EnhancedConfigManager()
-                enhanced_features = True
-            except Exception as e:
-                st.warning(f"Enhanced config manager failed, using legacy: {str(e)}")
-                config_manager = ConfigManager()
-                enhanced_features = False
-        else:
-            config_manager = ConfigManager()
-            enhanced_features = False
+        # The enhanced manager is only returned when the correlation modules import, so its
+        # flag is the single "correlation supported" check for the rest of the rerun
+        config_manager, correlation_supported = _get_config_manager(_correlation_available())
     except Exception as e:
         st.error(f"Failed to initialize config manager: {str(e)}")
         st.stop()
     
-    # Initialize simulator
+    # Initialize simulator (built once per process, see _get_simulator)
     try:
-        if CORRELATION_AVAILABLE and enhanced_features and st.session_state.use_correlation:
-            try:
-                simulator = CorrelatedMonteCarloSimulator()
-                correlation_enabled = True
-            except Exception as e:
-                st.warning(f"Correlation simulator failed, using standard: {str(e)}")
-                simulator = MonteCarloSimulator()
-                correlation_enabled = False
-        else:
-            simulator = MonteCarloSimulator()
-            correlation_enabled = False
+        use_correlated = correlation_supported and st.session_state.use_correlation
+        # The sidebar widget's state is already current here; correlation_scenario is copied from it below
+        scenario = st.session_state.get('correlation_scenario_sidebar', st.session_state.correlation_scenario)
+        simulator, correlation_enabled = _get_simulator(use_correlated, scenario if use_correlated else None,
+                                                        config_manager)
     except Exception as e:
         st.error(f"Failed to initialize simulator: {str(e)}")
         st.stop()
     
-    # Main header
-    st.title(get_text('main_title', lang))
-    
-    # Enhanced disclaimers section
-    UIComponents.render_disclaimers(lang)
-    
-    # Feature announcements
-    st.info("**" + ("Nuove Funzionalità" if lang == 'it' else "New Features") + "**: " + 
-            ("Questa versione include prelievi REALI che mantengono il potere d'acquisto e analisi VaR/CVaR integrata!" 
-             if lang == 'it' else 
-             "This version includes REAL withdrawals that maintain purchasing power and integrated VaR/CVaR analysis!"))
-    
-    st.success("**" + ("Analisi del Rischio Integrata" if lang == 'it' else "Integrated Risk Analysis") + "**: " + 
-              ("VaR e CVaR al 5% ora integrati direttamente nell'app per valutare i rischi estremi!" 
-               if lang == 'it' else 
-               "VaR and CVaR at 5% now integrated directly in the app to assess extreme risks!"))
+    # Create the worker up front so the kernel warm-up starts on the first page load
+    _get_executor()
     
-    st.markdown("---")
+    _render_header(lang)
     
     # Sidebar for parameters
     with st.sidebar:
         st.header(get_text('simulation_parameters', lang))
         
-        # General parameters
-        params = UIComponents.render_general_parameters(lang)
+        # General parameters, committed together on submit instead of one rerun per edit
+        with st.form('simulation_parameters_form', border=False):
+            params = UIComponents.render_general_parameters(lang)
+            st.form_submit_button(get_text('apply_parameters', lang))
+            # Running submits the form too, so a run never uses unapplied edits
+            run_simulation = UIComponents.render_run_simulation_button(lang)
         
         # CORRELATION SETTINGS (if available)
-        if CORRELATION_AVAILABLE and enhanced_features:
+        if correlation_supported:
             st.markdown("---")
-            st.subheader(("Correlazione Asset" if lang == 'it' else "Asset Correlation"))
+            st.subheader(get_text('asset_correlation', lang))
             
             try:
+                CorrelationUIComponents = _load_correlation_modules('CorrelationUIComponents')
                 use_correlation = CorrelationUIComponents.render_correlation_toggle(lang)
                 st.session_state.use_correlation = use_correlation
             except Exception as e:
@@ -256,26 +629,19 @@ def main():
                 st.session_state.use_correlation = False
             
             if use_correlation:
-                correlation_scenarios = ['normal_times', 'crisis_times', 'independent', 'defensive', 'high_inflation']
-                scenario_names = {
-                    'normal_times': 'Mercati Normali' if lang == 'it' else 'Normal Markets',
-                    'crisis_times': 'Crisi Finanziaria' if lang == 'it' else 'Financial Crisis', 
-                    'independent': 'Asset Indipendenti' if lang == 'it' else 'Independent Assets',
-                    'defensive': 'Scenario Difensivo' if lang == 'it' else 'Defensive Scenario',
-                    'high_inflation': 'Alta Inflazione' if lang == 'it' else 'High Inflation'
-                }
-                
+                scenario_names = get_scenario_names(lang)
                 selected_scenario = st.selectbox(
-                    ("Scenario:" if lang == 'it' else "Scenario:"),
-                    correlation_scenarios,
+                    get_text('scenario', lang),
+                    _CORRELATION_SCENARIOS,
                     format_func=lambda x: scenario_names.get(x, x),
                     index=0,
-                    key='correlation_scenario_sidebar'
+                    key='correlation_scenario_sidebar',
+                    on_change=_reset_correlation_override
                 )
                 
                 st.session_state.correlation_scenario = selected_scenario
                 
-                if st.button(("Impostazioni Avanzate" if lang == 'it' else "Advanced Settings")):
+                if st.button(get_text('advanced_settings', lang)):
                     st.session_state.show_correlation_settings = True
         
         # Initialize default profiles
@@ -313,104 +679,20 @@ def main():
             if st.button(get_text('load_profile', lang), key='load_ret_profile'):
                 PortfolioManager.load_retirement_profile(config_manager, retirement_profile)
     
+    # Advanced correlation settings (rerun in isolation, see _correlation_settings_fragment)
+    if correlation_enabled and st.session_state.show_correlation_settings:
+        _correlation_settings_fragment(config_manager, simulator, lang)
+    
     # Main area - Portfolio Configuration
     st.subheader(get_text('portfolio_config', lang))
     
-    accumulation_assets = st.session_state.current_accumulation_assets
-    retirement_assets = st.session_state.current_retirement_assets
-    
-    # Portfolio configuration UI
-    if use_same_portfolio:
-        st.subheader(get_text('accumulation_portfolio', lang))
-        
-        if accumulation_assets:
-            updated_assets = UIComponents.render_asset_editor(
-                accumulation_assets, lang, 'accumulation'
-            )
-            
-            st.session_state.current_accumulation_assets = updated_assets
-            
-            if st.session_state.use_same_portfolio:
-                st.session_state.current_retirement_assets = [asset.copy() for asset in updated_assets]
-            
-            reset_clicked, balance_clicked = UIComponents.render_allocation_controls(lang, 'accumulation')
-            
-            if reset_clicked:
-                PortfolioManager.reset_allocations('accumulation')
-            
-            if balance_clicked:
-                PortfolioManager.balance_allocations('accumulation')
-            
-            total_allocation = PortfolioManager.get_total_allocation(st.session_state.current_accumulation_assets)
-            UIComponents.render_allocation_status(total_allocation, lang)
-            
-            UIComponents.render_allocation_chart(st.session_state.current_accumulation_assets, lang, 'accumulation')
-            UIComponents.render_asset_summary(st.session_state.current_accumulation_assets, lang, 'accumulation')
-        else:
-            st.warning(get_text('select_profile', lang))
-    
-    else:
-        col1, col2 = st.columns(2)
-        
-        with col1:
-            st.subheader(get_text('accumulation_portfolio', lang))
-            
-            if accumulation_assets:
-                updated_acc_assets = UIComponents.render_asset_editor(
-                    accumulation_assets, lang, 'accumulation'
-                )
-                
-                st.session_state.current_accumulation_assets = updated_acc_assets
-                
-                reset_acc, balance_acc = UIComponents.render_allocation_controls(lang, 'accumulation')
-                
-                if reset_acc:
-                    PortfolioManager.reset_allocations('accumulation')
-                
-                if balance_acc:
-                    PortfolioManager.balance_allocations('accumulation')
-                
-                total_acc_allocation = PortfolioManager.get_total_allocation(st.session_state.current_accumulation_assets)
-                UIComponents.render_allocation_status(total_acc_allocation, lang)
-                
-                UIComponents.render_allocation_chart(st.session_state.current_accumulation_assets, lang, 'accumulation')
-                UIComponents.render_asset_summary(st.session_state.current_accumulation_assets, lang, 'accumulation')
-            else:
-                st.warning(get_text('select_profile', lang))
-        
-        with col2:
-            st.subheader(get_text('retirement_portfolio', lang))
-            
-            if retirement_assets:
-                updated_ret_assets = UIComponents.render_asset_editor(
-                    retirement_assets, lang, 'retirement'
-                )
-                
-                st.session_state.current_retirement_assets = updated_ret_assets
-                
-                reset_ret, balance_ret = UIComponents.render_allocation_controls(lang, 'retirement')
-                
-                if reset_ret:
-                    PortfolioManager.reset_allocations('retirement')
-                
-                if balance_ret:
-                    PortfolioManager.balance_allocations('retirement')
-                
-                total_ret_allocation = PortfolioManager.get_total_allocation(st.session_state.current_retirement_assets)
-                UIComponents.render_allocation_status(total_ret_allocation, lang)
-                
-                UIComponents.render_allocation_chart(st.session_state.current_retirement_assets, lang, 'retirement')
-                UIComponents.render_asset_summary(st.session_state.current_retirement_assets, lang, 'retirement')
-            else:
-                st.warning(get_text('select_profile', lang))
+    # Portfolio configuration UI; edits inside it rerun only the editor fragment
+    final_accumulation_assets, final_retirement_assets = _portfolio_editor_fragment(use_same_portfolio, lang)
     
     st.markdown("---")
     
-    # Run simulation button
-    if UIComponents.render_run_simulation_button(lang):
-        final_accumulation_assets = st.session_state.current_accumulation_assets
-        final_retirement_assets = st.session_state.current_retirement_assets
-        
+    # Run simulation (button in the sidebar parameters form)
+    if run_simulation:
         is_valid, active_accumulation_assets, active_retirement_assets = (
             PortfolioManager.validate_simulation_inputs(
                 final_accumulation_assets, final_retirement_assets, lang
@@ -418,69 +700,83 @@ def main():
         )
         
         if is_valid:
-            total_deposited = ResultsDisplay.calculate_total_deposited(
-                params['initial_amount'],
-                params['annual_contribution'],
-                params['years_to_retirement'],
-                params['adjust_contribution_inflation'],
-                params['inflation'] / 100
-            )
-            
-            progress_bar = st.progress(0)
-            status_text = st.empty()
-            
-            with st.spinner(get_text('simulation_progress', lang)):
-                try:
-                    # Run simulation
-                    results = simulator.run_simulation(
-                        active_accumulation_assets,
-                        active_retirement_assets,
-                        params['initial_amount'], 
-                        params['years_to_retirement'], 
-                        params['years_retired'],
-                        params['annual_contribution'], 
-                        params['adjust_contribution_inflation'], 
-                        params['inflation'] / 100, 
-                        params['withdrawal'],
-                        params['capital_gains_tax_rate'],
-                        params['n_simulations'],
-                        params['use_real_withdrawal'],
-                        progress_bar, 
-                        status_text, 
-                        lang
-                    )
-                    
-                    st.markdown("---")
+            try:
+                with st.status(get_text('simulation_progress', lang)) as run_status:
+                    progress = _ThrottledProgress(st.progress(0), params['n_simulations'], st.empty())
+                    worker_progress = _ProgressRecorder()
                     
-                    # Show completion messages
-                    st.success(("Simulazione completata" if lang == 'it' else "Simulation completed"))
+                    # A fixed seed gets its own generator (and, via params, its own cache entry)
+                    rng = np.random.default_rng(params['seed']) if params['seed'] else st.session_state.rng
                     
-                    if params['use_real_withdrawal']:
-                        st.success(("Utilizzato prelievo REALE (aggiustato per inflazione)" if lang == 'it' else "Used REAL withdrawal (inflation-adjusted)"))
-                    else:
-                        st.info(("Utilizzato prelievo NOMINALE (importo fisso)" if lang == 'it' else "Used NOMINAL withdrawal (fixed amount)"))
+                    # Columnar portfolios; the (read-only) accumulation arrays double as the
+                    # retirement ones when both phases hold the same assets
+                    accumulation_soa = PortfolioManager.assets_to_soa(active_accumulation_assets)
+                    retirement_soa = (accumulation_soa if active_retirement_assets == active_accumulation_assets
+                                      else PortfolioManager.assets_to_soa(active_retirement_assets))
                     
-                    st.success(("Analisi VaR/CVaR integrata nei risultati" if lang == 'it' else "VaR/CVaR analysis integrated in results"))
+                    override = st.session_state.correlation_override
+                    correlation = ((override['assets'], override['matrix'])
+                                   if correlation_enabled and override else None)
                     
-                    # Display results
-                    ResultsDisplay.show_results(
-                        results, 
-                        simulator,
-                        total_deposited, 
-                        params['n_simulations'], 
-                        params['years_to_retirement'], 
-                        params['years_retired'],
-                        params['capital_gains_tax_rate'],
-                        params['withdrawal'],
-                        params['inflation'],
-                        params['use_real_withdrawal'],
-                        lang
+                    # Run simulation off the script thread and poll its progress; the wait
+                    # returns as soon as the run finishes, so cache hits come back immediately
+                    future = _get_executor().submit(
+                        _run, simulator, correlation_enabled, params,
+                        accumulation_soa, retirement_soa,
+                        worker_progress, lang, rng, correlation
                     )
+                    try:
+                        while not wait((future,), timeout=0.1).done:
+                            progress.progress(worker_progress.value)
+                    finally:
+                        # A widget change or a new click interrupts this script run: stop the
+                        # worker's run too instead of letting it hold the shared executor
+                        if not future.done():
+                            worker_progress.cancel_event.set()
+                            future.cancel()
+                    simulation_method, simulator, results = future.result()
+                    simulator.results = results  # Per-run copy; cache hits skip run_simulation
+                    
+                    # Sum of the contribution schedule the run actually invested
+                    total_deposited = results['tax_details']['total_contributions']
                     
-                except Exception as e:
-                    st.error(f"Simulation error: {str(e)}")
-                    import traceback
-                    st.text(traceback.format_exc())
+                    progress.progress(1.0)
+                    progress.text(worker_progress.message or get_text('simulation_completed', lang))
+                    run_status.update(label=get_text('simulation_completed', lang), state='complete')
+                
+                st.markdown("---")
+                
+                if correlation_enabled and simulation_method != 'correlation':
+                    st.warning(get_text('correlation_fallback', lang))
+                
+                # Show completion messages
+                st.success(get_text('simulation_completed', lang))
+                
+                if params['use_real_withdrawal']:
+                    st.success(get_text('real_withdrawal_used', lang))
+                else:
+                    st.info(get_text('nominal_withdrawal_used', lang))
+                
+                st.success(get_text('var_cvar_integrated', lang))
+                
+                # Display results
+                ResultsDisplay.show_results(
+                    results, 
+                    simulator,
+                    total_deposited, 
+                    params['n_simulations'], 
+                    params['years_to_retirement'], 
+                    params['years_retired'],
+                    params['capital_gains_tax_rate'],
+                    params['withdrawal'],
+                    params['inflation'],
+                    params['use_real_withdrawal'],
+                    lang
+                )
+                
+            except Exception as e:
+                st.error(f"Simulation error: {str(e)}")
+                st.exception(e)
     
     # Footer
     UIComponents.render_footer(lang)
@@ -16,6 +16,8 @@ class ConfigManager:
         self.config_file = config_file
         self._asset_profiles = None
         self._asset_characteristics = None
+        self._asset_names = ()
+        self._profile_cache = {}
         self._load_config()
     
     def _load_config(self):
@@ -31,6 +33,7 @@ class ConfigManager:
             
             self._asset_profiles = config['asset_profiles']
             self._asset_characteristics = config['asset_characteristics']
+            self._asset_names = tuple(self._asset_characteristics)
             
         except Exception as e:
             lang = st.session_state.get('language', 'en')
@@ -47,11 +50,22 @@ class ConfigManager:
         """Get asset characteristics"""
         return self._asset_characteristics
     
+    @property
+    def asset_names(self):
+        """Get asset names in configuration order"""
+        return self._asset_names
+    
     def get_profile_data(self, profile_name):
-        """Get data for a specific profile"""
+        """Get data for a specific profile (merged once per profile, returned as fresh copies)"""
         if profile_name not in self._asset_profiles:
             return None
         
+        if profile_name not in self._profile_cache:
+            self._profile_cache[profile_name] = self._merge_profile(profile_name)
+        return [dict(asset) for asset in self._profile_cache[profile_name]]
+    
+    def _merge_profile(self, profile_name):
+        """Combine a profile's allocations with the shared asset characteristics"""
         loaded_assets = []
         for asset_profile in self._asset_profiles[profile_name]:
             asset_name = asset_profile['name']
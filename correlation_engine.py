@@ -3,18 +3,28 @@ Enhanced Monte Carlo simulation engine with asset correlation support - FIXED VE
 CORRECTED: Eliminati tutti i problemi di calcolo che causavano successo rate troppo alti
 """
 
+import logging
 import numpy as np
 from typing import List, Dict, Tuple
 from translations import get_text
+from simulation_kernels import (pack_assets, portfolio_returns, contribution_schedule,
+                                withdrawal_schedule, simulate_paths, run_chunked, build_results)
+
+logger = logging.getLogger(__name__)
 
 
 class CorrelatedMonteCarloSimulator:
     """Monte Carlo simulation engine with asset correlation support - FIXED"""
     
-    def __init__(self):
+    def __init__(self, seed=None):
         self.results = None
         self.use_enhanced_tax = True
         self.correlation_matrix = None
+        self.correlation_assets = None
+        self.cholesky_factor = None
+        self._matrix_source = None
+        self._loadings_cache = {}
+        self.rng = np.random.default_rng(seed)
         
     def set_correlation_matrix(self, assets_list, correlation_matrix=None):
         """
@@ -24,26 +34,43 @@ class CorrelatedMonteCarloSimulator:
             assets_list: List of asset names in order
             correlation_matrix: 2D array of correlations, if None uses default
         """
+        # Same assets and the same input matrix as last time: keep the validated state
+        if (correlation_matrix is not None and self._matrix_source is not None
+                and list(assets_list) == self.correlation_assets
+                and np.array_equal(correlation_matrix, self._matrix_source)):
+            return
+        
         n_assets = len(assets_list)
+        cholesky_factor = None
+        source = None
         
         if correlation_matrix is None:
             # Default correlation matrix based on typical asset relationships
-            self.correlation_matrix = self._get_default_correlation_matrix(assets_list)
+            correlation_matrix = self._get_default_correlation_matrix(assets_list)
         else:
             # Validate provided correlation matrix
+            source = np.array(correlation_matrix)
             if correlation_matrix.shape != (n_assets, n_assets):
                 raise ValueError(f"Correlation matrix must be {n_assets}x{n_assets}")
             
             # Ensure matrix is symmetric and positive semi-definite
             correlation_matrix = (correlation_matrix + correlation_matrix.T) / 2
             
-            # Check if positive semi-definite, if not use nearest valid matrix
-            eigenvals = np.linalg.eigvals(correlation_matrix)
-            if np.any(eigenvals < -1e-8):
-                print("Warning: Correlation matrix is not positive semi-definite. Using nearest valid matrix.")
-                correlation_matrix = self._nearest_correlation_matrix(correlation_matrix)
-            
-            self.correlation_matrix = correlation_matrix
+            # A successful Cholesky both proves the matrix positive definite and yields the
+            # factor the sampler needs; only a failed one pays for the (symmetric) eigen check
+            try:
+                cholesky_factor = np.linalg.cholesky(correlation_matrix)
+            except np.linalg.LinAlgError:
+                if np.linalg.eigvalsh(correlation_matrix).min() < -1e-8:
+                    logger.warning("Correlation matrix is not positive semi-definite. Using nearest valid matrix.")
+                    correlation_matrix = self._nearest_correlation_matrix(correlation_matrix)
+        
+        # Only a validated matrix replaces the current state
+        self.correlation_assets = list(assets_list)
+        self.correlation_matrix = correlation_matrix
+        self.cholesky_factor = cholesky_factor
+        self._matrix_source = source
+        self._loadings_cache = {}
     
     def _get_default_correlation_matrix(self, assets_list):
         """Generate default correlation matrix based on asset types"""
@@ -103,38 +130,67 @@ class CorrelatedMonteCarloSimulator:
         
         return result
     
-    def _generate_correlated_returns(self, mean_returns, volatilities, correlation_matrix, n_simulations):
+    @staticmethod
+    def _cholesky(correlation_matrix):
+        """Factor a correlation matrix, falling back to the eigen square root if only semi-definite"""
+        try:
+            return np.linalg.cholesky(correlation_matrix)
+        except np.linalg.LinAlgError:
+            eigenvals, eigenvecs = np.linalg.eigh(correlation_matrix)
+            return eigenvecs * np.sqrt(np.clip(eigenvals, 0.0, None))
+    
+    def _get_phase_loadings(self, asset_names):
         """
-        Generate correlated asset returns using multivariate normal distribution
+        Get the loading matrix B (B @ B.T = phase correlation matrix) for a list of assets
+        
+        Uses rows of the stored Cholesky factor when the configured matrix covers
+        every asset, otherwise factors the default matrix for the phase. Loadings are
+        memoized per asset list until the matrix changes.
+        """
+        key = tuple(asset_names)
+        loadings = self._loadings_cache.get(key)
+        if loadings is None:
+            loadings = self._loadings_cache[key] = self._compute_phase_loadings(key)
+        return loadings
+    
+    def _compute_phase_loadings(self, asset_names):
+        """Build the loading matrix for _get_phase_loadings"""
+        if (self.correlation_matrix is not None and self.correlation_assets
+                and all(name in self.correlation_assets for name in asset_names)):
+            if self.cholesky_factor is None:
+                self.cholesky_factor = self._cholesky(self.correlation_matrix)
+            indices = [self.correlation_assets.index(name) for name in asset_names]
+            return self.cholesky_factor[indices, :]
+        
+        return self._cholesky(self._get_default_correlation_matrix(asset_names))
+    
+    def _generate_correlated_returns(self, mean_returns, volatilities, loadings, n_simulations, n_years, rng):
+        """
+        Generate correlated asset returns from standard normals and a Cholesky loading
         
         Args:
             mean_returns: List of mean returns for each asset
             volatilities: List of volatilities for each asset
-            correlation_matrix: Asset correlation matrix
-            n_simulations: Number of return scenarios to generate
+            loadings: Loading matrix from _get_phase_loadings
+            n_simulations: Number of simulated paths
+            n_years: Number of years per path
+            rng: numpy Generator to draw the shocks from
             
         Returns:
-            Array of shape (n_simulations, n_assets) with correlated returns
+            Float32 array of shape (n_simulations, n_years, n_assets) with correlated returns
         """
-        n_assets = len(mean_returns)
-        
-        # Create covariance matrix from correlation matrix and volatilities
-        vol_matrix = np.outer(volatilities, volatilities)
-        covariance_matrix = correlation_matrix * vol_matrix
-        
-        # Generate correlated random returns
-        correlated_returns = np.random.multivariate_normal(
-            mean=mean_returns,
-            cov=covariance_matrix,
-            size=n_simulations
-        )
-        
-        return correlated_returns
+        # Fold the volatilities into the loading and flatten paths and years, so the
+        # whole draw is a single (n_simulations * n_years, k) x (k, n_assets) GEMM
+        transform = (loadings * np.asarray(volatilities)[:, None]).T.astype(np.float32)
+        shocks = rng.standard_normal((n_simulations * n_years, loadings.shape[1]), dtype=np.float32)
+        returns = shocks @ transform
+        returns += np.asarray(mean_returns, dtype=np.float32)
+        return returns.reshape(n_simulations, n_years, -1)
     
     def run_simulation(self, accumulation_assets, retirement_assets, initial_amount, years_to_retirement, 
                       years_retired, annual_contribution, adjust_contribution_inflation,
                       inflation, withdrawal, capital_gains_tax_rate, n_simulations,
-                      use_real_withdrawal=True, progress_bar=None, status_text=None, lang='en'):
+                      use_real_withdrawal=True, progress_bar=None, status_text=None, lang='en', rng=None):
         """
         Standard interface compatible with MonteCarloSimulator - delegates to correlation version
         """
@@ -142,96 +198,60 @@ class CorrelatedMonteCarloSimulator:
             accumulation_assets, retirement_assets, initial_amount, years_to_retirement, 
             years_retired, annual_contribution, adjust_contribution_inflation,
             inflation, withdrawal, capital_gains_tax_rate, n_simulations, 
-            use_real_withdrawal, progress_bar, status_text, lang
+            use_real_withdrawal, progress_bar, status_text, lang, rng
         )
 
     def run_simulation_with_correlation(self, accumulation_assets, retirement_assets, 
                                       initial_amount, years_to_retirement, years_retired,
                                       annual_contribution, adjust_contribution_inflation,
                                       inflation, withdrawal, capital_gains_tax_rate, 
-                                      n_simulations, use_real_withdrawal=True, progress_bar=None, status_text=None, lang='en'):
+                                      n_simulations, use_real_withdrawal=True, progress_bar=None, status_text=None, lang='en',
+                                      rng=None):
         """
         Run Monte Carlo simulation with correlated asset returns - FIXED VERSION
+        
+        rng: Optional numpy Generator to draw from (defaults to the simulator's own)
         """
+        rng = self.rng if rng is None else rng
         
-        # Prepare asset data
-        acc_asset_names = [asset['name'] for asset in accumulation_assets]
-        ret_asset_names = [asset['name'] for asset in retirement_assets]
+        # Per-field asset arrays (no-op if the caller already packed them)
+        acc = pack_assets(accumulation_assets)
+        ret = pack_assets(retirement_assets)
         
-        # Set up correlation matrices
-        acc_correlation_matrix = None
-        ret_correlation_matrix = None
+        # Set up correlation loadings once per run
+        acc_loadings = self._get_phase_loadings(acc['names'])
+        ret_loadings = self._get_phase_loadings(ret['names'])
         
-        if self.correlation_matrix is not None:
-            # Use the same correlation structure for both phases
-            # This assumes the same asset universe
-            all_asset_names = list(set(acc_asset_names + ret_asset_names))
-            
-            # Create sub-matrices for each phase
-            acc_indices = [all_asset_names.index(name) for name in acc_asset_names if name in all_asset_names]
-            ret_indices = [all_asset_names.index(name) for name in ret_asset_names if name in all_asset_names]
-            
-            if len(acc_indices) == len(acc_asset_names):
-                acc_correlation_matrix = self.correlation_matrix[np.ix_(acc_indices, acc_indices)]
-            if len(ret_indices) == len(ret_asset_names):
-                ret_correlation_matrix = self.correlation_matrix[np.ix_(ret_indices, ret_indices)]
+        contributions = contribution_schedule(initial_amount, years_to_retirement, annual_contribution,
+                                              adjust_contribution_inflation, inflation)
+        withdrawals = withdrawal_schedule(withdrawal, years_to_retirement, years_retired,
+                                          inflation, use_real_withdrawal)
         
-        # If no correlation matrix set, create default ones
-        if acc_correlation_matrix is None:
-            temp_sim = CorrelatedMonteCarloSimulator()
-            temp_sim.set_correlation_matrix(acc_asset_names)
-            acc_correlation_matrix = temp_sim.correlation_matrix
+        def simulate_chunk(n_paths, chunk_rng):
+            acc_correlated_returns = self._generate_correlated_returns(
+                acc['mean_returns'], acc['volatilities'], acc_loadings, n_paths, int(years_to_retirement), chunk_rng
+            )
+            ret_correlated_returns = self._generate_correlated_returns(
+                ret['mean_returns'], ret['volatilities'], ret_loadings, n_paths, int(years_retired), chunk_rng
+            )
             
-        if ret_correlation_matrix is None:
-            temp_sim = CorrelatedMonteCarloSimulator()
-            temp_sim.set_correlation_matrix(ret_asset_names)
-            ret_correlation_matrix = temp_sim.correlation_matrix
-        
-        # Prepare data arrays
-        acc_mean_returns = [asset['return'] / 100 for asset in accumulation_assets]
-        acc_volatilities = [asset['volatility'] / 100 for asset in accumulation_assets]
-        acc_allocations = [asset['allocation'] / 100 for asset in accumulation_assets]
-        acc_min_returns = [asset['min_return'] / 100 for asset in accumulation_assets]
-        acc_max_returns = [asset['max_return'] / 100 for asset in accumulation_assets]
-        acc_ters = [asset['ter'] / 100 for asset in accumulation_assets]
-        
-        ret_mean_returns = [asset['return'] / 100 for asset in retirement_assets]
-        ret_volatilities = [asset['volatility'] / 100 for asset in retirement_assets]
-        ret_allocations = [asset['allocation'] / 100 for asset in retirement_assets]
-        ret_min_returns = [asset['min_return'] / 100 for asset in retirement_assets]
-        ret_max_returns = [asset['max_return'] / 100 for asset in retirement_assets]
-        ret_ters = [asset['ter'] / 100 for asset in retirement_assets]
-        
-        # Results storage
-        accumulation_balances = []
-        accumulation_balances_nominal = []
-        final_results = []
-        detailed_tax_results = []
-        real_withdrawal_amounts = []
-        
-        for sim in range(n_simulations):
-            # Update progress with safe status_text handling
-            if progress_bar and sim % 100 == 0:
-                progress_bar.progress((sim + 1) / n_simulations)
-                if status_text and hasattr(status_text, 'text'):
-                    status_text.text(get_text('simulation_step', lang).format(sim + 1, n_simulations))
+            acc_returns = portfolio_returns(acc_correlated_returns, acc['allocations'],
+                                            acc['min_returns'], acc['max_returns'], acc['ters'])
+            ret_returns = portfolio_returns(ret_correlated_returns, ret['allocations'],
+                                            ret['min_returns'], ret['max_returns'], ret['ters'])
             
-            # Run single simulation with correlation - FIXED
-            result = self._run_single_simulation_with_correlation_fixed(
-                acc_mean_returns, acc_volatilities, acc_allocations, acc_min_returns, 
-                acc_max_returns, acc_ters, acc_correlation_matrix,
-                ret_mean_returns, ret_volatilities, ret_allocations, ret_min_returns, 
-                ret_max_returns, ret_ters, ret_correlation_matrix,
-                initial_amount, years_to_retirement, years_retired,
-                annual_contribution, adjust_contribution_inflation, inflation, withdrawal, 
-                capital_gains_tax_rate, use_real_withdrawal
-            )
+            # Real return during retirement, (1 + r) / (1 + i) - 1 formed in place
+            ret_returns += 1
+            ret_returns /= 1 + inflation
+            ret_returns -= 1
             
-            accumulation_balances.append(result['accumulation_real'])
-            accumulation_balances_nominal.append(result['accumulation_nominal'])
-            final_results.append(result['final'])
-            detailed_tax_results.append(result['tax_details'])
-            real_withdrawal_amounts.append(result.get('real_withdrawal', withdrawal))
+            return simulate_paths(acc_returns, ret_returns, contributions, withdrawals,
+                                  capital_gains_tax_rate / 100)
+        
+        # Draw correlated returns and run the kernel in independent batches
+        paths = run_chunked(simulate_chunk, n_simulations, rng, progress_bar)
+        self.results = build_results(paths, contributions, years_to_retirement, years_retired,
+                                     inflation, withdrawal, use_real_withdrawal)
         
         # Update final progress with safe status_text handling
         if progress_bar:
@@ -239,315 +259,17 @@ class CorrelatedMonteCarloSimulator:
             if status_text and hasattr(status_text, 'text'):
                 status_text.text(get_text('simulation_completed', lang))
         
-        self.results = {
-            'accumulation': accumulation_balances,
-            'accumulation_nominal': accumulation_balances_nominal,
-            'final': final_results,
-            'real_withdrawal': real_withdrawal_amounts,
-            'tax_details': detailed_tax_results,
-            'use_real_withdrawal': use_real_withdrawal
-        }
-        
         return self.results
     
-    def _run_single_simulation_with_correlation_fixed(self, acc_mean_returns, acc_volatilities, acc_allocations, 
-                                              acc_min_returns, acc_max_returns, acc_ters, acc_correlation_matrix,
-                                              ret_mean_returns, ret_volatilities, ret_allocations,
-                                              ret_min_returns, ret_max_returns, ret_ters, ret_correlation_matrix,
-                                              initial_amount, years_to_retirement, years_retired, 
-                                              annual_contribution, adjust_contribution_inflation, 
-                                              inflation, base_withdrawal, capital_gains_tax_rate, use_real_withdrawal):
-        """Run a single simulation with correlated returns - FIXED VERSION"""
-        
-        try:
-            from tax_engine import EnhancedTaxEngine
-        except ImportError:
-            # Fallback to simple method if tax_engine is not available
-            return self._run_single_simulation_simple_with_correlation_fixed(
-                acc_mean_returns, acc_volatilities, acc_allocations, acc_min_returns, 
-                acc_max_returns, acc_ters, acc_correlation_matrix,
-                ret_mean_returns, ret_volatilities, ret_allocations, ret_min_returns, 
-                ret_max_returns, ret_ters, ret_correlation_matrix,
-                initial_amount, years_to_retirement, years_retired,
-                annual_contribution, adjust_contribution_inflation, inflation, base_withdrawal, 
-                capital_gains_tax_rate, use_real_withdrawal
-            )
-        
-        # Initialize tax engine
-        tax_engine = EnhancedTaxEngine(capital_gains_tax_rate)
-        
-        # Add initial contribution
-        if initial_amount > 0:
-            tax_engine.add_contribution(initial_amount, 0)
-        
-        current_contribution = annual_contribution
-        
-        # Generate correlated returns for accumulation phase
-        acc_correlated_returns = self._generate_correlated_returns(
-            acc_mean_returns, acc_volatilities, acc_correlation_matrix, 
-            int(years_to_retirement)
-        )
-        
-        # Accumulation phase with correlated returns
-        for year in range(int(years_to_retirement)):
-            # Use pre-generated correlated returns for this year
-            annual_returns = acc_correlated_returns[year]
-            
-            # Apply caps and TER
-            capped_returns = [max(min(annual_returns[i], acc_max_returns[i]), acc_min_returns[i]) 
-                            for i in range(len(annual_returns))]
-            net_returns = [capped_returns[i] - acc_ters[i] for i in range(len(capped_returns))]
-            annual_return_nominal = sum(net_returns[i] * acc_allocations[i] 
-                                      for i in range(len(net_returns)))
-            
-            # Apply returns to tax engine
-            tax_engine.apply_returns(annual_return_nominal, year + 1)
-            
-            # Add contribution
-            if current_contribution > 0:
-                tax_engine.add_contribution(current_contribution, year + 1)
-            
-            if adjust_contribution_inflation:
-                current_contribution *= (1 + inflation)
-        
-        # Get portfolio status at end of accumulation
-        portfolio_status = tax_engine.get_portfolio_status()
-        accumulation_nominal = portfolio_status['total_portfolio_value']
-        
-        # Convert to real value
-        balance_real = accumulation_nominal / ((1 + inflation) ** years_to_retirement)
-        accumulation_real = balance_real
-        
-        # Generate correlated returns for retirement phase
-        ret_correlated_returns = self._generate_correlated_returns(
-            ret_mean_returns, ret_volatilities, ret_correlation_matrix, 
-            int(years_retired)
-        )
-        
-        # FIXED: Retirement phase with corrected withdrawal calculations
-        annual_taxes_paid = []
-        annual_net_withdrawals = []
-        annual_gross_withdrawals = []
-        annual_capital_gains = []
-        total_real_withdrawals = 0
-        withdrawal_count = 0
-        
-        for year in range(int(years_retired)):
-            # Use pre-generated correlated returns for this year
-            if year < len(ret_correlated_returns):
-                annual_returns = ret_correlated_returns[year]
-            else:
-                # Fallback to independent returns if we run out
-                annual_returns = [np.random.normal(ret_mean_returns[i], ret_volatilities[i]) 
-                                for i in range(len(ret_mean_returns))]
-            
-            # Apply caps and TER
-            capped_returns = [max(min(annual_returns[i], ret_max_returns[i]), ret_min_returns[i]) 
-                            for i in range(len(annual_returns))]
-            net_returns = [capped_returns[i] - ret_ters[i] for i in range(len(capped_returns))]
-            annual_return_nominal = sum(net_returns[i] * ret_allocations[i] 
-                                      for i in range(len(net_returns)))
-            
-            # FIXED: Calculate real return correctly
-            annual_return_real = (1 + annual_return_nominal) / (1 + inflation) - 1
-            
-            # Apply returns to portfolio
-            tax_engine.apply_returns(annual_return_real, years_to_retirement + year + 1)
-            
-            # Check current portfolio status
-            current_status = tax_engine.get_portfolio_status()
-            current_portfolio_value = current_status['total_portfolio_value']
-            
-            if current_portfolio_value <= 0:
-                break
-            
-            # FIXED: Calculate withdrawal amount based on real vs nominal choice (same logic as simulation_engine.py)
-            if use_real_withdrawal:
-                # REAL withdrawal: Maintain constant purchasing power
-                # Total inflation years from today = years_to_retirement + current_year
-                total_inflation_years = years_to_retirement + year
-                withdrawal_amount = base_withdrawal * ((1 + inflation) ** total_inflation_years)
-            else:
-                # NOMINAL withdrawal: Keep same amount every year (no adjustment)
-                withdrawal_amount = base_withdrawal
-            
-            # Limit to available portfolio
-            actual_withdrawal_amount = min(withdrawal_amount, current_portfolio_value)
-            
-            # Execute withdrawal with tax calculation
-            withdrawal_result = tax_engine.calculate_withdrawal_tax(actual_withdrawal_amount)
-            
-            annual_gross_withdrawals.append(withdrawal_result['gross_withdrawal'])
-            annual_net_withdrawals.append(withdrawal_result['net_withdrawal'])
-            annual_taxes_paid.append(withdrawal_result['taxes_owed'])
-            annual_capital_gains.append(withdrawal_result['capital_gains'])
-            
-            # Track withdrawals for statistics
-            total_real_withdrawals += withdrawal_result['net_withdrawal']
-            withdrawal_count += 1
-            
-            # Check if portfolio is depleted
-            final_status = tax_engine.get_portfolio_status()
-            if final_status['total_portfolio_value'] <= 0:
-                break
-        
-        # Get final portfolio status
-        final_status = tax_engine.get_portfolio_status()
-        final_portfolio_value = final_status['total_portfolio_value']
-        
-        # Calculate average real withdrawal
-        avg_real_withdrawal = total_real_withdrawals / withdrawal_count if withdrawal_count > 0 else base_withdrawal
-        
-        # Prepare tax details
-        tax_details = {
-            'total_contributions': final_status['total_contributions'],
-            'total_withdrawals': final_status['total_withdrawals'],
-            'total_taxes_paid': final_status['total_taxes_paid'],
-            'total_capital_gains_realized': final_status.get('total_capital_gains_realized', 0),
-            'average_annual_tax': np.mean(annual_taxes_paid) if annual_taxes_paid else 0,
-            'total_years_with_withdrawals': len(annual_taxes_paid),
-            'use_real_withdrawal': use_real_withdrawal,
-            'base_withdrawal': base_withdrawal,
-            'final_withdrawal': (base_withdrawal * ((1 + inflation) ** (years_to_retirement + years_retired - 1)) 
-                               if use_real_withdrawal and years_retired > 0 else base_withdrawal)
-        }
-        
-        return {
-            'accumulation_nominal': accumulation_nominal,
-            'accumulation_real': accumulation_real,
-            'final': final_portfolio_value,
-            'real_withdrawal': avg_real_withdrawal,
-            'tax_details': tax_details
-        }
-    
-    def _run_single_simulation_simple_with_correlation_fixed(self, acc_mean_returns, acc_volatilities, acc_allocations, 
-                                                     acc_min_returns, acc_max_returns, acc_ters, acc_correlation_matrix,
-                                                     ret_mean_returns, ret_volatilities, ret_allocations,
-                                                     ret_min_returns, ret_max_returns, ret_ters, ret_correlation_matrix,
-                                                     initial_amount, years_to_retirement, years_retired, 
-                                                     annual_contribution, adjust_contribution_inflation, 
-                                                     inflation, base_withdrawal, capital_gains_tax_rate, use_real_withdrawal):
-        """Simplified simulation with correlation - FIXED VERSION"""
-        
-        balance_nominal = initial_amount
-        total_deposited = initial_amount
-        current_contribution = annual_contribution
-        
-        # Generate correlated returns for accumulation phase
-        acc_correlated_returns = self._generate_correlated_returns(
-            acc_mean_returns, acc_volatilities, acc_correlation_matrix, 
-            int(years_to_retirement)
-        )
-        
-        # Accumulation phase
-        for year in range(int(years_to_retirement)):
-            annual_returns = acc_correlated_returns[year]
-            capped_returns = [max(min(annual_returns[i], acc_max_returns[i]), acc_min_returns[i]) 
-                            for i in range(len(annual_returns))]
-            net_returns = [capped_returns[i] - acc_ters[i] for i in range(len(capped_returns))]
-            annual_return_nominal = sum(net_returns[i] * acc_allocations[i] 
-                                      for i in range(len(net_returns)))
-            
-            balance_nominal *= (1 + annual_return_nominal)
-            balance_nominal += current_contribution
-            total_deposited += current_contribution
-            
-            if adjust_contribution_inflation:
-                current_contribution *= (1 + inflation)
-        
-        accumulation_nominal = balance_nominal
-        balance_real = balance_nominal / ((1 + inflation) ** years_to_retirement)
-        accumulation_real = balance_real
-        
-        # Calculate tax effects
-        total_deposited_real = total_deposited / ((1 + inflation) ** years_to_retirement)
-        capital_gains = max(0, accumulation_real - total_deposited_real)
-        capital_gains_percentage = capital_gains / accumulation_real if accumulation_real > 0 else 0
-        
-        tax_rate_decimal = capital_gains_tax_rate / 100
-        effective_tax_rate = tax_rate_decimal * capital_gains_percentage
-        
-        # Generate correlated returns for retirement phase
-        ret_correlated_returns = self._generate_correlated_returns(
-            ret_mean_returns, ret_volatilities, ret_correlation_matrix, 
-            int(years_retired)
-        )
-        
-        # FIXED: Retirement phase with same logic as simulation_engine.py
-        balance = balance_real
-        total_real_withdrawals = 0
-        withdrawal_count = 0
-        
-        for year in range(int(years_retired)):
-            if year < len(ret_correlated_returns):
-                annual_returns = ret_correlated_returns[year]
-            else:
-                annual_returns = [np.random.normal(ret_mean_returns[i], ret_volatilities[i]) 
-                                for i in range(len(ret_mean_returns))]
-            
-            capped_returns = [max(min(annual_returns[i], ret_max_returns[i]), ret_min_returns[i]) 
-                            for i in range(len(ret_mean_returns))]
-            net_returns = [capped_returns[i] - ret_ters[i] for i in range(len(capped_returns))]
-            annual_return_nominal = sum(net_returns[i] * ret_allocations[i] 
-                                      for i in range(len(net_returns)))
-            
-            # FIXED: Calculate real return correctly
-            annual_return_real = (1 + annual_return_nominal) / (1 + inflation) - 1
-            
-            balance *= (1 + annual_return_real)
-            
-            # FIXED: Calculate withdrawal amount based on real vs nominal choice (same logic as simulation_engine.py)
-            if use_real_withdrawal:
-                # REAL withdrawal: Maintain constant purchasing power
-                # Total inflation years from today = years_to_retirement + current_year
-                total_inflation_years = years_to_retirement + year
-                withdrawal_amount = base_withdrawal * ((1 + inflation) ** total_inflation_years)
-            else:
-                # NOMINAL withdrawal: Keep same amount every year (no adjustment)
-                withdrawal_amount = base_withdrawal
-            
-            # Apply tax effects to withdrawal
-            real_withdrawal_multiplier = 1 - effective_tax_rate
-            after_tax_withdrawal = withdrawal_amount * real_withdrawal_multiplier
-            
-            balance -= after_tax_withdrawal
-            
-            # Track withdrawals for statistics
-            total_real_withdrawals += after_tax_withdrawal
-            withdrawal_count += 1
-            
-            if balance < 0:
-                balance = 0
-                break
-        
-        # Calculate average real withdrawal
-        avg_real_withdrawal = total_real_withdrawals / withdrawal_count if withdrawal_count > 0 else base_withdrawal
-        
-        return {
-            'accumulation_nominal': accumulation_nominal,
-            'accumulation_real': accumulation_real,
-            'final': balance,
-            'real_withdrawal': avg_real_withdrawal,
-            'tax_details': {
-                'use_real_withdrawal': use_real_withdrawal,
-                'base_withdrawal': base_withdrawal,
-                'final_withdrawal': (base_withdrawal * ((1 + inflation) ** (years_to_retirement + years_retired - 1)) 
-                                   if use_real_withdrawal and years_retired > 0 else base_withdrawal),
-                'effective_tax_rate': effective_tax_rate,
-                'total_years_with_withdrawals': withdrawal_count
-            }
-        }
-    
-    # Include all the other methods from the original class
     def get_correlation_matrix(self):
         """Get the current correlation matrix"""
         return self.correlation_matrix
     
     def calculate_success_rate(self):
-        """Calculate success rate from simulation results"""
+        """Calculate success rate from simulation results (paths not depleted by a withdrawal)"""
         if not self.results:
             return 0
-        return sum(r > 0 for r in self.results['final']) / len(self.results['final']) * 100
+        return float(np.mean(np.asarray(self.results['final']) > 0) * 100)
     
     def get_statistics(self):
         """Get comprehensive statistics from simulation results"""
@@ -575,62 +297,35 @@ class CorrelatedMonteCarloSimulator:
         if not self.results or 'tax_details' not in self.results:
             return {}
         
+        # Columnar tax details: one array entry per simulated path
         tax_data = self.results['tax_details']
-        valid_tax_data = [detail for detail in tax_data if detail]
+        total_taxes_paid = np.asarray(tax_data['total_taxes_paid'])
+        total_withdrawals = np.asarray(tax_data['total_withdrawals'])
         
-        if not valid_tax_data:
+        if total_taxes_paid.size == 0:
             return {}
         
-        # Check if we have enhanced tax details
-        has_enhanced_details = any('total_taxes_paid' in detail for detail in valid_tax_data)
+        effective_tax_rates = np.divide(total_taxes_paid * 100, total_withdrawals,
+                                        out=np.zeros_like(total_taxes_paid), where=total_withdrawals > 0)
         
-        if has_enhanced_details:
-            total_taxes_paid = [detail.get('total_taxes_paid', 0) for detail in valid_tax_data]
-            total_withdrawals = [detail.get('total_withdrawals', 0) for detail in valid_tax_data]
-            
-            effective_tax_rates = []
-            for i, detail in enumerate(valid_tax_data):
-                if total_withdrawals[i] > 0:
-                    effective_rate = (detail.get('total_taxes_paid', 0) / total_withdrawals[i]) * 100
-                    effective_tax_rates.append(effective_rate)
-                else:
-                    effective_tax_rates.append(0.0)
-            
-            return {
-                'total_taxes_statistics': {
-                    'mean': np.mean(total_taxes_paid),
-                    'median': np.percentile(total_taxes_paid, 50),
-                    'min': np.min(total_taxes_paid),
-                    'max': np.max(total_taxes_paid),
-                    'std': np.std(total_taxes_paid)
-                },
-                'effective_tax_rate_statistics': {
-                    'mean': np.mean(effective_tax_rates),
-                    'median': np.percentile(effective_tax_rates, 50),
-                    'min': np.min(effective_tax_rates),
-                    'max': np.max(effective_tax_rates),
-                    'std': np.std(effective_tax_rates)
-                },
-                'withdrawal_info': {
-                    'use_real_withdrawal': valid_tax_data[0].get('use_real_withdrawal', False),
-                    'base_withdrawal': valid_tax_data[0].get('base_withdrawal', 0),
-                    'avg_final_withdrawal': np.mean([detail.get('final_withdrawal', 0) for detail in valid_tax_data])
-                }
-            }
-        else:
-            effective_rates = [detail.get('effective_tax_rate', 0) * 100 for detail in valid_tax_data]
-            
-            return {
-                'effective_tax_rate_statistics': {
-                    'mean': np.mean(effective_rates),
-                    'median': np.percentile(effective_rates, 50),
-                    'min': np.min(effective_rates),
-                    'max': np.max(effective_rates),
-                    'std': np.std(effective_rates)
-                },
-                'withdrawal_info': {
-                    'use_real_withdrawal': valid_tax_data[0].get('use_real_withdrawal', False),
-                    'base_withdrawal': valid_tax_data[0].get('base_withdrawal', 0),
-                    'avg_final_withdrawal': np.mean([detail.get('final_withdrawal', 0) for detail in valid_tax_data])
-                }
+        return {
+            'total_taxes_statistics': {
+                'mean': np.mean(total_taxes_paid),
+                'median': np.percentile(total_taxes_paid, 50),
+                'min': np.min(total_taxes_paid),
+                'max': np.max(total_taxes_paid),
+                'std': np.std(total_taxes_paid)
+            },
+            'effective_tax_rate_statistics': {
+                'mean': np.mean(effective_tax_rates),
+                'median': np.percentile(effective_tax_rates, 50),
+                'min': np.min(effective_tax_rates),
+                'max': np.max(effective_tax_rates),
+                'std': np.std(effective_tax_rates)
+            },
+            'withdrawal_info': {
+                'use_real_withdrawal': tax_data['use_real_withdrawal'],
+                'base_withdrawal': tax_data['base_withdrawal'],
+                'avg_final_withdrawal': tax_data['final_withdrawal']
             }
+        }
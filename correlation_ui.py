@@ -10,12 +10,107 @@ import plotly.graph_objects as go
 from translations import get_text, get_asset_names
 
 
+# Scenario labels for the settings selector, keyed by language
+_SETTINGS_SCENARIO_NAMES = {
+    'it': {
+        'normal_times': 'Condizioni Normali',
+        'crisis_times': 'Crisi Finanziaria',
+        'independent': 'Asset Indipendenti',
+        'custom': 'Personalizzata'
+    },
+    'en': {
+        'normal_times': 'Normal Times',
+        'crisis_times': 'Financial Crisis',
+        'independent': 'Independent Assets',
+        'custom': 'Custom'
+    }
+}
+
+# Explanation shown in the correlation impact analysis, keyed by language
+_IMPACT_ANALYSIS_TEXT = {
+    'it': """
+                **Come la correlazione influenza il portafoglio:**
+                
+                📈 **Correlazione Positiva (0 < r < 1):**
+                - Gli asset si muovono nella stessa direzione
+                - Riduce l'efficacia della diversificazione
+                - Aumenta il rischio durante le crisi
+                
+                📉 **Correlazione Negativa (-1 < r < 0):**
+                - Gli asset si muovono in direzioni opposte
+                - Migliora la diversificazione
+                - Fornisce protezione naturale
+                
+                🔄 **Correlazione Zero (r = 0):**
+                - Movimenti completamente indipendenti
+                - Massima efficacia della diversificazione teorica
+                - Raramente osservato nella realtà
+                """,
+    'en': """
+                **How correlation affects your portfolio:**
+                
+                📈 **Positive Correlation (0 < r < 1):**
+                - Assets move in the same direction
+                - Reduces diversification effectiveness
+                - Increases risk during crises
+                
+                📉 **Negative Correlation (-1 < r < 0):**
+                - Assets move in opposite directions
+                - Improves diversification
+                - Provides natural protection
+                
+                🔄 **Zero Correlation (r = 0):**
+                - Completely independent movements
+                - Maximum theoretical diversification benefit
+                - Rarely observed in reality
+                """
+}
+
+
+@st.cache_data(show_spinner=False)
+def _build_corr_heatmap(matrix_bytes, shape, display_names, lang):
+    """Build the correlation heatmap figure, cached on the matrix bytes"""
+    correlation_matrix = np.frombuffer(matrix_bytes).reshape(shape)
+    
+    fig = px.imshow(
+        correlation_matrix,
+        x=list(display_names),
+        y=list(display_names),
+        color_continuous_scale='RdBu',
+        aspect='auto',
+        title="Matrice di Correlazione Asset" if lang == 'it' else "Asset Correlation Matrix",
+        zmin=-1,
+        zmax=1
+    )
+    
+    # Add correlation values as text
+    fig.update_traces(
+        text=np.around(correlation_matrix, decimals=2),
+        texttemplate="%{text}",
+        textfont={"size": 10}
+    )
+    
+    fig.update_layout(
+        width=600,
+        height=500,
+        xaxis_title="Asset",
+        yaxis_title="Asset"
+    )
+    
+    return fig
+
+
 class CorrelationUIComponents:
     """UI components for managing asset correlations with safety checks"""
     
     @staticmethod
-    def render_correlation_settings(config_manager, lang):
-        """Render correlation settings section with backward compatibility"""
+    def render_correlation_settings(config_manager, lang, default_scenario=None, on_change=None):
+        """
+        Render correlation settings section with backward compatibility
+        
+        The scenario selector starts on default_scenario when it is one of its options;
+        on_change is called when the user picks a scenario.
+        """
         st.subheader("🔗 " + ("Impostazioni Correlazione Asset" if lang == 'it' else "Asset Correlation Settings"))
         
         # Check if config_manager has correlation capabilities
@@ -24,25 +119,21 @@ class CorrelationUIComponents:
         if not has_correlation_scenarios:
             st.warning("⚠️ " + ("Config manager non supporta correlazioni - usando fallback" if lang == 'it' else "Config manager doesn't support correlations - using fallback"))
             # Create fallback correlation matrix
-            asset_names = list(config_manager.asset_characteristics.keys())
+            asset_names = config_manager.asset_names
             correlation_matrix = np.eye(len(asset_names))  # Identity matrix as fallback
             return 'independent', correlation_matrix
         
         # Correlation scenario selector
-        correlation_scenarios = ['normal_times', 'crisis_times', 'independent', 'custom']
-        scenario_names = {
-            'normal_times': 'Condizioni Normali' if lang == 'it' else 'Normal Times',
-            'crisis_times': 'Crisi Finanziaria' if lang == 'it' else 'Financial Crisis',
-            'independent': 'Asset Indipendenti' if lang == 'it' else 'Independent Assets',
-            'custom': 'Personalizzata' if lang == 'it' else 'Custom'
-        }
+        correlation_scenarios = list(_SETTINGS_SCENARIO_NAMES['en'])
+        scenario_names = _SETTINGS_SCENARIO_NAMES.get(lang, _SETTINGS_SCENARIO_NAMES['en'])
         
         selected_scenario = st.selectbox(
             "Scenario di Correlazione:" if lang == 'it' else "Correlation Scenario:",
             correlation_scenarios,
             format_func=lambda x: scenario_names[x],
-            index=0,
-            key='correlation_scenario'
+            index=correlation_scenarios.index(default_scenario) if default_scenario in correlation_scenarios else 0,
+            key='correlation_settings_scenario',
+            on_change=on_change
         )
         
         # Load correlation matrix based on scenario
@@ -70,11 +161,11 @@ class CorrelationUIComponents:
                 except Exception as e:
                     st.error(f"Error loading correlation matrix: {str(e)}")
                     # Fallback to identity matrix
-                    asset_names = list(config_manager.asset_characteristics.keys())
+                    asset_names = config_manager.asset_names
                     correlation_matrix = np.eye(len(asset_names))
             else:
                 # Fallback to identity matrix
-                asset_names = list(config_manager.asset_characteristics.keys())
+                asset_names = config_manager.asset_names
                 correlation_matrix = np.eye(len(asset_names))
         
         return selected_scenario, correlation_matrix
@@ -83,7 +174,7 @@ class CorrelationUIComponents:
     def _render_correlation_matrix_editor(config_manager, lang):
         """Render editable correlation matrix with error handling"""
         try:
-            asset_names = list(config_manager.asset_characteristics.keys())
+            asset_names = config_manager.asset_names
             translated_names = get_asset_names(lang)
             display_names = [translated_names.get(name, name) for name in asset_names]
             
@@ -128,7 +219,7 @@ class CorrelationUIComponents:
         except Exception as e:
             st.error(f"Error in correlation matrix editor: {str(e)}")
             # Return identity matrix as safe fallback
-            n_assets = len(list(config_manager.asset_characteristics.keys()))
+            n_assets = len(config_manager.asset_names)
             return np.eye(n_assets)
     
     @staticmethod
@@ -268,30 +359,10 @@ class CorrelationUIComponents:
                 st.error("Dimension mismatch between correlation matrix and asset names")
                 return
             
-            # Create heatmap
-            fig = px.imshow(
-                correlation_matrix,
-                x=display_names,
-                y=display_names,
-                color_continuous_scale='RdBu',
-                aspect='auto',
-                title="Matrice di Correlazione Asset" if lang == 'it' else "Asset Correlation Matrix",
-                zmin=-1,
-                zmax=1
-            )
-            
-            # Add correlation values as text
-            fig.update_traces(
-                text=np.around(correlation_matrix, decimals=2),
-                texttemplate="%{text}",
-                textfont={"size": 10}
-            )
-            
-            fig.update_layout(
-                width=600,
-                height=500,
-                xaxis_title="Asset",
-                yaxis_title="Asset"
+            # Create heatmap (cached on the matrix contents)
+            correlation_matrix = np.ascontiguousarray(correlation_matrix, dtype=np.float64)
+            fig = _build_corr_heatmap(
+                correlation_matrix.tobytes(), correlation_matrix.shape, tuple(display_names), lang
             )
             
             st.plotly_chart(fig, use_container_width=True)
@@ -344,44 +415,7 @@ class CorrelationUIComponents:
             st.subheader("🎯 " + ("Analisi Impatto Correlazione" if lang == 'it' else "Correlation Impact Analysis"))
             
             # Explanation of correlation effects
-            if lang == 'it':
-                st.markdown("""
-                **Come la correlazione influenza il portafoglio:**
-                
-                📈 **Correlazione Positiva (0 < r < 1):**
-                - Gli asset si muovono nella stessa direzione
-                - Riduce l'efficacia della diversificazione
-                - Aumenta il rischio durante le crisi
-                
-                📉 **Correlazione Negativa (-1 < r < 0):**
-                - Gli asset si muovono in direzioni opposte
-                - Migliora la diversificazione
-                - Fornisce protezione naturale
-                
-                🔄 **Correlazione Zero (r = 0):**
-                - Movimenti completamente indipendenti
-                - Massima efficacia della diversificazione teorica
-                - Raramente osservato nella realtà
-                """)
-            else:
-                st.markdown("""
-                **How correlation affects your portfolio:**
-                
-                📈 **Positive Correlation (0 < r < 1):**
-                - Assets move in the same direction
-                - Reduces diversification effectiveness
-                - Increases risk during crises
-                
-                📉 **Negative Correlation (-1 < r < 0):**
-                - Assets move in opposite directions
-                - Improves diversification
-                - Provides natural protection
-                
-                🔄 **Zero Correlation (r = 0):**
-                - Completely independent movements
-                - Maximum theoretical diversification benefit
-                - Rarely observed in reality
-                """)
+            st.markdown(_IMPACT_ANALYSIS_TEXT.get(lang, _IMPACT_ANALYSIS_TEXT['en']))
         
         except Exception as e:
             st.error(f"Error in correlation impact analysis: {str(e)}")
@@ -3,11 +3,14 @@ Enhanced Configuration manager with correlation support - FIXED VERSION
 """
 
 import json
+import logging
 import os
 import streamlit as st
 import numpy as np
 from translations import get_text
 
+logger = logging.getLogger(__name__)
+
 
 class EnhancedConfigManager:
     """Enhanced configuration manager with correlation support"""
@@ -16,6 +19,8 @@ class EnhancedConfigManager:
         self.config_file = config_file
         self._asset_profiles = None
         self._asset_characteristics = None
+        self._asset_names = ()
+        self._profile_cache = {}
         self._correlation_matrix = None
         self._correlation_scenarios = None
         self._correlation_metadata = None
@@ -41,6 +46,7 @@ class EnhancedConfigManager:
             # Load basic configuration
             self._asset_profiles = config['asset_profiles']
             self._asset_characteristics = config['asset_characteristics']
+            self._asset_names = tuple(self._asset_characteristics)
             
             # Load correlation data if available
             if 'correlation_matrix' in config:
@@ -48,7 +54,7 @@ class EnhancedConfigManager:
                     'assets': config['correlation_matrix']['assets'],
                     'matrix': np.array(config['correlation_matrix']['matrix'])
                 }
-                print(f"✅ Loaded default correlation matrix for {len(self._correlation_matrix['assets'])} assets")
+                logger.info("Loaded default correlation matrix for %d assets", len(self._correlation_matrix['assets']))
             
             if 'correlation_scenarios' in config:
                 self._correlation_scenarios = {}
@@ -59,17 +65,18 @@ class EnhancedConfigManager:
                         'stress_level': scenario_data.get('stress_level', 'unknown'),
                         'matrix': np.array(scenario_data['matrix'])
                     }
-                print(f"✅ Loaded {len(self._correlation_scenarios)} correlation scenarios: {list(self._correlation_scenarios.keys())}")
+                logger.info("Loaded %d correlation scenarios: %s", len(self._correlation_scenarios),
+                            list(self._correlation_scenarios))
             
             # Load correlation metadata if available
             if 'correlation_metadata' in config:
                 self._correlation_metadata = config['correlation_metadata']
-                print("✅ Loaded correlation metadata")
+                logger.info("Loaded correlation metadata")
             
         except Exception as e:
             lang = st.session_state.get('language', 'en')
             st.error(get_text('config_load_error', lang).format(str(e)))
-            print(f"❌ Config loading error: {str(e)}")
+            logger.error("Config loading error: %s", e)
             st.stop()
     
     @property
@@ -82,6 +89,11 @@ class EnhancedConfigManager:
         """Get asset characteristics"""
         return self._asset_characteristics
     
+    @property
+    def asset_names(self):
+        """Get asset names in configuration order"""
+        return self._asset_names
+    
     @property
     def correlation_matrix(self):
         """Get default correlation matrix"""
@@ -98,10 +110,16 @@ class EnhancedConfigManager:
         return self._correlation_metadata
     
     def get_profile_data(self, profile_name):
-        """Get data for a specific profile"""
+        """Get data for a specific profile (merged once per profile, returned as fresh copies)"""
         if profile_name not in self._asset_profiles:
             return None
         
+        if profile_name not in self._profile_cache:
+            self._profile_cache[profile_name] = self._merge_profile(profile_name)
+        return [dict(asset) for asset in self._profile_cache[profile_name]]
+    
+    def _merge_profile(self, profile_name):
+        """Combine a profile's allocations with the shared asset characteristics"""
         loaded_assets = []
         for asset_profile in self._asset_profiles[profile_name]:
             asset_name = asset_profile['name']
@@ -141,30 +159,30 @@ class EnhancedConfigManager:
             numpy array with correlation matrix, or None if not available
         """
         if not self._correlation_scenarios or scenario not in self._correlation_scenarios:
-            print(f"⚠️ Scenario '{scenario}' not found in correlation scenarios")
+            logger.warning("Scenario '%s' not found in correlation scenarios", scenario)
             return None
         
         if not self._correlation_matrix or 'assets' not in self._correlation_matrix:
-            print("⚠️ No default correlation matrix available")
+            logger.warning("No default correlation matrix available")
             return None
         
         # Get the full asset list from config
         config_assets = self._correlation_matrix['assets']
         scenario_matrix = self._correlation_scenarios[scenario]['matrix']
         
-        print(f"🔍 Looking for assets {asset_names} in config assets {config_assets}")
+        logger.debug("Looking for assets %s in config assets %s", asset_names, config_assets)
         
         # Find indices for requested assets
         try:
             asset_indices = [config_assets.index(asset_name) for asset_name in asset_names]
-            print(f"✅ Found asset indices: {asset_indices}")
+            logger.debug("Found asset indices: %s", asset_indices)
         except ValueError as e:
-            print(f"❌ Some assets not found in correlation matrix: {e}")
+            logger.warning("Some assets not found in correlation matrix: %s", e)
             return None
         
         # Extract submatrix for requested assets
         submatrix = scenario_matrix[np.ix_(asset_indices, asset_indices)]
-        print(f"✅ Extracted {submatrix.shape} correlation submatrix for scenario '{scenario}'")
+        logger.debug("Extracted %s correlation submatrix for scenario '%s'", submatrix.shape, scenario)
         return submatrix
     
     def get_correlation_scenario_info(self, scenario_name):
@@ -201,10 +219,10 @@ class EnhancedConfigManager:
             try:
                 asset_indices = [config_assets.index(asset_name) for asset_name in asset_names]
                 submatrix = default_matrix[np.ix_(asset_indices, asset_indices)]
-                print(f"✅ Using config default correlation matrix for {asset_names}")
+                logger.debug("Using config default correlation matrix for %s", asset_names)
                 return submatrix
             except ValueError:
-                print(f"⚠️ Some assets not in config, generating fallback correlation matrix")
+                logger.info("Some assets not in config, generating fallback correlation matrix")
         
         # Fallback: generate basic correlation matrix
         default_correlations = {
@@ -245,7 +263,7 @@ class EnhancedConfigManager:
                         else:
                             correlation_matrix[i, j] = 0.1
         
-        print(f"🔧 Generated fallback correlation matrix for {asset_names}")
+        logger.debug("Generated fallback correlation matrix for %s", asset_names)
         return correlation_matrix
     
     def save_custom_correlation_matrix(self, asset_names, correlation_matrix, scenario_name='custom'):
@@ -258,15 +276,12 @@ class EnhancedConfigManager:
             scenario_name: Name for the custom scenario
         """
         # Store in session state for current session
-        if 'custom_correlations' not in st.session_state:
-            st.session_state.custom_correlations = {}
-        
-        st.session_state.custom_correlations[scenario_name] = {
+        st.session_state.setdefault('custom_correlations', {})[scenario_name] = {
             'assets': asset_names,
             'matrix': correlation_matrix.tolist(),
             'description': f'Custom correlation scenario: {scenario_name}'
         }
-        print(f"💾 Saved custom correlation matrix '{scenario_name}' for assets {asset_names}")
+        logger.info("Saved custom correlation matrix '%s' for assets %s", scenario_name, asset_names)
     
     def get_available_correlation_scenarios(self):
         """Get list of available correlation scenarios"""
@@ -284,7 +299,7 @@ class EnhancedConfigManager:
         if 'independent' not in scenarios:
             scenarios.append('independent')
         
-        print(f"📋 Available correlation scenarios: {scenarios}")
+        logger.debug("Available correlation scenarios: %s", scenarios)
         return scenarios
     
     def export_correlation_config(self, filename='custom_correlations.json'):
@@ -313,7 +328,7 @@ class EnhancedConfigManager:
         try:
             with open(filename, 'w', encoding='utf-8') as f:
                 json.dump(export_data, f, indent=2, ensure_ascii=False)
-            print(f"💾 Exported correlation config to {filename}")
+            logger.info("Exported correlation config to %s", filename)
             return True
         except Exception as e:
             st.error(f"Error exporting correlation config: {str(e)}")
@@ -327,8 +342,7 @@ class EnhancedConfigManager:
             
             if 'correlation_scenarios' in import_data:
                 # Store imported scenarios in session state
-                if 'imported_correlations' not in st.session_state:
-                    st.session_state.imported_correlations = {}
+                st.session_state.setdefault('imported_correlations', {})
                 
                 for name, scenario in import_data['correlation_scenarios'].items():
                     st.session_state.imported_correlations[name] = {
@@ -337,7 +351,7 @@ class EnhancedConfigManager:
                         'assets': import_data.get('asset_list', [])
                     }
             
-            print(f"📂 Imported correlation config from {filename}")
+            logger.info("Imported correlation config from %s", filename)
             return True
         
         except Exception as e:
@@ -3,7 +3,9 @@ Portfolio management utilities for the Monte Carlo Investment Simulator
 FIXED VERSION - Risolti i problemi di caricamento asset
 """
 
+import numpy as np
 import streamlit as st
+from simulation_kernels import pack_assets
 
 
 class PortfolioManager:
@@ -12,33 +14,23 @@ class PortfolioManager:
     @staticmethod
     def initialize_session_state():
         """Initialize session state variables"""
-        if 'language' not in st.session_state:
-            st.session_state.language = 'en'
-        
-        if 'edit_mode' not in st.session_state:
-            st.session_state.edit_mode = {}
-        
-        # Separate profiles for accumulation and retirement
-        if 'last_selected_accumulation_profile' not in st.session_state:
-            st.session_state.last_selected_accumulation_profile = None
-        
-        if 'last_selected_retirement_profile' not in st.session_state:
-            st.session_state.last_selected_retirement_profile = None
-        
-        # Separate assets for accumulation and retirement
-        if 'current_accumulation_assets' not in st.session_state:
-            st.session_state.current_accumulation_assets = []
-        
-        if 'current_retirement_assets' not in st.session_state:
-            st.session_state.current_retirement_assets = []
-        
-        # Flag to use same portfolio for both phases
-        if 'use_same_portfolio' not in st.session_state:
-            st.session_state.use_same_portfolio = True
-        
-        # NUOVO: Flag per forzare il refresh degli asset dopo il caricamento
-        if 'force_asset_refresh' not in st.session_state:
-            st.session_state.force_asset_refresh = False
+        # Built per call so the mutable defaults are never shared between sessions
+        defaults = {
+            'language': 'en',
+            'edit_mode': {},
+            # Separate profiles for accumulation and retirement
+            'last_selected_accumulation_profile': None,
+            'last_selected_retirement_profile': None,
+            # Separate assets for accumulation and retirement
+            'current_accumulation_assets': [],
+            'current_retirement_assets': [],
+            # Flag to use same portfolio for both phases
+            'use_same_portfolio': True,
+            # NUOVO: Flag per forzare il refresh degli asset dopo il caricamento
+            'force_asset_refresh': False,
+        }
+        for key, value in defaults.items():
+            st.session_state.setdefault(key, value)
     
     @staticmethod
     def load_accumulation_profile(config_manager, selected_profile):
@@ -46,8 +38,8 @@ class PortfolioManager:
         # FIXED: Carica SEMPRE il profilo, anche se è lo stesso
         loaded_assets = config_manager.get_profile_data(selected_profile)
         if loaded_assets:
-            # Crea una copia profonda degli asset per evitare riferimenti condivisi
-            st.session_state.current_accumulation_assets = [asset.copy() for asset in loaded_assets]
+            # get_profile_data already hands out fresh dicts; only the retirement copy needs its own
+            st.session_state.current_accumulation_assets = loaded_assets
             st.session_state.last_selected_accumulation_profile = selected_profile
             
             # If using same portfolio, also load for retirement
@@ -65,8 +57,7 @@ class PortfolioManager:
         # FIXED: Carica SEMPRE il profilo, anche se è lo stesso
         loaded_assets = config_manager.get_profile_data(selected_profile)
         if loaded_assets:
-            # Crea una copia profonda degli asset
-            st.session_state.current_retirement_assets = [asset.copy() for asset in loaded_assets]
+            st.session_state.current_retirement_assets = loaded_assets
             st.session_state.last_selected_retirement_profile = selected_profile
             
             # Forza il refresh degli asset
@@ -80,7 +71,7 @@ class PortfolioManager:
         if not st.session_state.current_accumulation_assets:
             loaded_assets = config_manager.get_profile_data(accumulation_profile)
             if loaded_assets:
-                st.session_state.current_accumulation_assets = [asset.copy() for asset in loaded_assets]
+                st.session_state.current_accumulation_assets = loaded_assets
                 st.session_state.last_selected_accumulation_profile = accumulation_profile
         
         if not st.session_state.current_retirement_assets:
@@ -91,7 +82,7 @@ class PortfolioManager:
             else:
                 loaded_assets = config_manager.get_profile_data(retirement_profile)
                 if loaded_assets:
-                    st.session_state.current_retirement_assets = [asset.copy() for asset in loaded_assets]
+                    st.session_state.current_retirement_assets = loaded_assets
                     st.session_state.last_selected_retirement_profile = retirement_profile
     
     @staticmethod
@@ -108,16 +99,17 @@ class PortfolioManager:
     @staticmethod
     def reset_allocations(phase='accumulation'):
         """Reset all allocations to 0 for specified phase"""
-        if phase == 'accumulation' and 'current_accumulation_assets' in st.session_state:
-            for asset in st.session_state.current_accumulation_assets:
+        assets_key = f'current_{phase}_assets'
+        if assets_key in st.session_state:
+            assets = st.session_state[assets_key]
+            # Already cleared: skip the writes and the extra rerun
+            if not any(asset['allocation'] for asset in assets):
+                return
+            for asset in assets:
                 asset['allocation'] = 0.0
-            if st.session_state.use_same_portfolio:
+            if phase == 'accumulation' and st.session_state.use_same_portfolio:
                 PortfolioManager.sync_retirement_to_accumulation()
             st.rerun()
-        elif phase == 'retirement' and 'current_retirement_assets' in st.session_state:
-            for asset in st.session_state.current_retirement_assets:
-                asset['allocation'] = 0.0
-            st.rerun()
     
     @staticmethod
     def balance_allocations(phase='accumulation'):
@@ -126,14 +118,16 @@ class PortfolioManager:
         if assets_key in st.session_state:
             assets = st.session_state[assets_key]
             # Distribute equally among assets with allocation > 0
-            active_assets = [asset for asset in assets if asset['allocation'] > 0]
-            if active_assets:
-                equal_alloc = 100.0 / len(active_assets)
-                for asset in assets:
-                    if asset['allocation'] > 0:
-                        asset['allocation'] = equal_alloc
-                    else:
-                        asset['allocation'] = 0.0
+            targets = [asset['allocation'] > 0 for asset in assets]
+            n_active = sum(targets)
+            if n_active:
+                equal_alloc = 100.0 / n_active
+                targets = [equal_alloc if active else 0.0 for active in targets]
+                # Already balanced: skip the writes and the extra rerun
+                if all(asset['allocation'] == target for asset, target in zip(assets, targets)):
+                    return
+                for asset, target in zip(assets, targets):
+                    asset['allocation'] = target
                 
                 if phase == 'accumulation' and st.session_state.use_same_portfolio:
                     PortfolioManager.sync_retirement_to_accumulation()
@@ -142,7 +136,26 @@ class PortfolioManager:
     @staticmethod
     def get_total_allocation(assets_data):
         """Calculate total allocation across all assets"""
-        return sum(asset['allocation'] for asset in assets_data)
+        return float(np.fromiter((asset['allocation'] for asset in assets_data),
+                                 dtype=np.float64, count=len(assets_data)).sum())
+    
+    @staticmethod
+    def assets_to_soa(assets_data):
+        """
+        Columnar (structure-of-arrays) form of a portfolio for the simulators
+        
+        One array per field with percents converted to decimals; see pack_assets.
+        """
+        return pack_assets(assets_data)
+    
+    @staticmethod
+    def _active_assets(assets_data):
+        """Assets with a positive allocation and their allocation total, from one array of allocations"""
+        allocations = np.fromiter((asset['allocation'] for asset in assets_data),
+                                  dtype=np.float64, count=len(assets_data))
+        active = allocations > 0
+        return ([asset for asset, keep in zip(assets_data, active) if keep],
+                float(allocations[active].sum()))
     
     @staticmethod
     def validate_simulation_inputs(accumulation_assets, retirement_assets, lang):
@@ -156,9 +169,9 @@ class PortfolioManager:
         if not retirement_assets:
             retirement_assets = st.session_state.get('current_retirement_assets', [])
         
-        # Filter only assets with allocation > 0
-        active_accumulation_assets = [asset for asset in accumulation_assets if asset['allocation'] > 0]
-        active_retirement_assets = [asset for asset in retirement_assets if asset['allocation'] > 0]
+        # Filter only assets with allocation > 0, totalling them in the same pass
+        active_accumulation_assets, accumulation_total = PortfolioManager._active_assets(accumulation_assets)
+        active_retirement_assets, retirement_total = PortfolioManager._active_assets(retirement_assets)
         
         if not active_accumulation_assets:
             st.error(get_text('select_accumulation_assets_error', lang))
@@ -169,13 +182,11 @@ class PortfolioManager:
             return False, None, None
         
         # Check accumulation allocations
-        accumulation_total = sum(asset['allocation'] for asset in active_accumulation_assets)
         if abs(accumulation_total - 100.0) > 0.01:
             st.error(get_text('fix_accumulation_allocations_error', lang))
             return False, None, None
         
         # Check retirement allocations
-        retirement_total = sum(asset['allocation'] for asset in active_retirement_assets)
         if abs(retirement_total - 100.0) > 0.01:
             st.error(get_text('fix_retirement_allocations_error', lang))
             return False, None, None
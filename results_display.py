@@ -12,27 +12,122 @@ import numpy as np
 from translations import get_text
 
 
+# Capital gains taxation explainer; formatted with the tax rate and a worked net example
+_TAX_EXPLANATION = {
+    'it': """
+                **🏛️ Meccanismo di Tassazione Capital Gains:**
+                
+                1. **Solo i guadagni vengono tassati** al {rate:.1f}%
+                2. **Il capitale iniziale non è tassato** (è già stato tassato quando guadagnato)
+                3. **Metodo proporzionale**: quando prelevi, una parte è capitale originale (non tassato) e una parte è guadagno (tassato)
+                4. **Tassazione effettiva** dipende da quanto è cresciuto il portafoglio
+                
+                **Esempio**: Se il tuo portafoglio vale €200.000 e hai depositato €100.000:
+                - 50% è capitale originale (non tassato)
+                - 50% sono guadagni (tassati al {rate:.1f}%)
+                - Su un prelievo di €10.000: €5.000 non tassati + €5.000 tassati = circa €{net_example:,.0f} netti
+                """,
+    'en': """
+                **🏛️ Capital Gains Taxation Mechanism:**
+                
+                1. **Only gains are taxed** at {rate:.1f}%
+                2. **Original capital is not taxed** (already taxed when earned)
+                3. **Proportional method**: when you withdraw, part is original capital (not taxed) and part is gain (taxed)
+                4. **Effective taxation** depends on how much the portfolio has grown
+                
+                **Example**: If your portfolio is worth €200,000 and you deposited €100,000:
+                - 50% is original capital (not taxed)
+                - 50% are gains (taxed at {rate:.1f}%)
+                - On a €10,000 withdrawal: €5,000 not taxed + €5,000 taxed = about €{net_example:,.0f} net
+                """
+}
+
+# VaR/CVaR explanation shown in the risk analysis expander, keyed by language
+_VAR_CVAR_EXPLANATION = {
+    'it': """
+                **📊 Value at Risk (VaR) al 5%:**
+                - Indica il valore minimo che il tuo portafoglio raggiungerà nel 95% dei casi
+                - Es: VaR 5% = €50.000 significa che solo nel 5% dei casi peggiori il portafoglio varrà meno di €50.000
+                
+                **📉 Conditional Value at Risk (CVaR) al 5%:**
+                - È il valore medio del portafoglio nei peggiori 5% degli scenari
+                - Es: CVaR 5% = €30.000 significa che quando le cose vanno davvero male, il portafoglio vale in media €30.000
+                
+                **🎯 Perché sono importanti:**
+                - Aiutano a comprendere i rischi estremi del tuo piano di investimento
+                - CVaR è sempre ≤ VaR e mostra quanto possono essere gravi le perdite estreme
+                - Utili per valutare se puoi tollerare gli scenari peggiori
+                """,
+    'en': """
+                **📊 Value at Risk (VaR) at 5%:**
+                - Indicates the minimum value your portfolio will reach in 95% of cases
+                - Ex: VaR 5% = €50,000 means that only in the worst 5% of cases will the portfolio be worth less than €50,000
+                
+                **📉 Conditional Value at Risk (CVaR) at 5%:**
+                - Is the average portfolio value in the worst 5% of scenarios
+                - Ex: CVaR 5% = €30,000 means when things go really bad, the portfolio averages €30,000
+                
+                **🎯 Why they matter:**
+                - Help understand extreme risks of your investment plan
+                - CVaR is always ≤ VaR and shows how severe extreme losses can be
+                - Useful for assessing whether you can tolerate worst-case scenarios
+                """
+}
+
+# How to read the final-value distribution chart, keyed by language
+_DISTRIBUTION_CHART_HELP = {
+    'it': """
+            **📖 Come leggere il grafico:**
+            - **Linea rossa tratteggiata (VaR 5%)**: Solo il 5% dei risultati è a sinistra di questa linea
+            - **Linea rossa continua (CVaR 5%)**: Valore medio di tutti i risultati a sinistra del VaR 5%
+            - **Linea verde punteggiata**: Valore medio di tutti gli scenari
+            """,
+    'en': """
+            **📖 How to read the chart:**
+            - **Red dashed line (VaR 5%)**: Only 5% of results are to the left of this line
+            - **Red solid line (CVaR 5%)**: Average value of all results to the left of VaR 5%
+            - **Green dotted line**: Average value across all scenarios
+            """
+}
+
+
 class ResultsDisplay:
     """Enhanced display of simulation results with CORRECTED REAL withdrawal analysis and integrated VaR/CVaR metrics"""
     
+    @staticmethod
+    def calculate_var_cvar(values, confidence_level=0.95):
+        """
+        Calculate VaR and CVaR together from a single partial partition
+
+        VaR is the linearly interpolated (1 - confidence_level) percentile, as np.percentile
+        returns; CVaR is the mean of the values at or below it.
+        """
+        if len(values) == 0:
+            return 0.0, 0.0
+        values_array = np.asarray(values, dtype=float)
+        position = (1 - confidence_level) * (values_array.size - 1)
+        lower = int(position)
+        upper = min(lower + 1, values_array.size - 1)
+        partitioned = np.partition(values_array, (lower, upper))
+        var_value = partitioned[lower] + (partitioned[upper] - partitioned[lower]) * (position - lower)
+        
+        # Everything left of the upper pivot is in the tail; right of it only ties with VaR can be
+        rest = partitioned[upper:]
+        rest = rest[rest <= var_value]
+        tail_count = upper + rest.size
+        if tail_count == 0:
+            return var_value, var_value
+        return var_value, (partitioned[:upper].sum() + rest.sum()) / tail_count
+    
     @staticmethod
     def calculate_var(values, confidence_level=0.95):
         """Calculate Value at Risk (VaR) at specified confidence level"""
-        if not values or len(values) == 0:
-            return 0.0
-        values_array = np.array(values)
-        percentile = (1 - confidence_level) * 100
-        return np.percentile(values_array, percentile)
+        return ResultsDisplay.calculate_var_cvar(values, confidence_level)[0]
     
     @staticmethod
     def calculate_cvar(values, confidence_level=0.95):
         """Calculate Conditional Value at Risk (CVaR) at specified confidence level"""
-        if not values or len(values) == 0:
-            return 0.0
-        var_value = ResultsDisplay.calculate_var(values, confidence_level)
-        values_array = np.array(values)
-        tail_values = values_array[values_array <= var_value]
-        return np.mean(tail_values) if len(tail_values) > 0 else var_value
+        return ResultsDisplay.calculate_var_cvar(values, confidence_level)[1]
     
     @staticmethod
     def calculate_cagr(final_value, initial_value, years):
@@ -45,12 +140,13 @@ class ResultsDisplay:
     def calculate_total_deposited(initial_amount, annual_contribution, years_to_retirement, 
                                  adjust_contribution_inflation, inflation):
         """Calculate total amount deposited"""
-        if adjust_contribution_inflation:
-            total_deposited = initial_amount
-            current_contribution = annual_contribution
-            for year in range(int(years_to_retirement)):
-                total_deposited += current_contribution
-                current_contribution *= (1 + inflation / 100)
+        growth = inflation / 100
+        if adjust_contribution_inflation and growth != 0:
+            # Geometric series of contributions growing by `growth` each year
+            years = int(years_to_retirement)
+            total_deposited = initial_amount + annual_contribution * ((1 + growth) ** years - 1) / growth
+        elif adjust_contribution_inflation:
+            total_deposited = initial_amount + annual_contribution * int(years_to_retirement)
         else:
             total_deposited = initial_amount + (annual_contribution * years_to_retirement)
         return total_deposited
@@ -264,34 +360,10 @@ class ResultsDisplay:
         
         # Tax explanation
         with st.expander("ℹ️ " + ("Come Funziona la Tassazione" if lang == 'it' else "How Taxation Works")):
-            if lang == 'it':
-                st.markdown(f"""
-                **🏛️ Meccanismo di Tassazione Capital Gains:**
-                
-                1. **Solo i guadagni vengono tassati** al {capital_gains_tax_rate:.1f}%
-                2. **Il capitale iniziale non è tassato** (è già stato tassato quando guadagnato)
-                3. **Metodo proporzionale**: quando prelevi, una parte è capitale originale (non tassato) e una parte è guadagno (tassato)
-                4. **Tassazione effettiva** dipende da quanto è cresciuto il portafoglio
-                
-                **Esempio**: Se il tuo portafoglio vale €200.000 e hai depositato €100.000:
-                - 50% è capitale originale (non tassato)
-                - 50% sono guadagni (tassati al {capital_gains_tax_rate:.1f}%)
-                - Su un prelievo di €10.000: €5.000 non tassati + €5.000 tassati = circa €{10000 * (1 - capital_gains_tax_rate/100 * 0.5):,.0f} netti
-                """)
-            else:
-                st.markdown(f"""
-                **🏛️ Capital Gains Taxation Mechanism:**
-                
-                1. **Only gains are taxed** at {capital_gains_tax_rate:.1f}%
-                2. **Original capital is not taxed** (already taxed when earned)
-                3. **Proportional method**: when you withdraw, part is original capital (not taxed) and part is gain (taxed)
-                4. **Effective taxation** depends on how much the portfolio has grown
-                
-                **Example**: If your portfolio is worth €200,000 and you deposited €100,000:
-                - 50% is original capital (not taxed)
-                - 50% are gains (taxed at {capital_gains_tax_rate:.1f}%)
-                - On a €10,000 withdrawal: €5,000 not taxed + €5,000 taxed = about €{10000 * (1 - capital_gains_tax_rate/100 * 0.5):,.0f} net
-                """)
+            st.markdown(_TAX_EXPLANATION.get(lang, _TAX_EXPLANATION['en']).format(
+                rate=capital_gains_tax_rate,
+                net_example=10000 * (1 - capital_gains_tax_rate / 100 * 0.5)
+            ))
     
     @staticmethod
     def _show_enhanced_detailed_statistics(stats, years_to_retirement, years_retired, total_deposited, inflation_rate, lang):
@@ -451,8 +523,14 @@ class ResultsDisplay:
             st.error("📉 " + ("Crescita bassa durante accumulo" if lang == 'it' else "Low growth during accumulation"))
     
     @staticmethod
+    @st.fragment
     def _show_enhanced_charts_with_scatter(accumulation_nominal, accumulation_real, final_nominal, final_real, lang):
-        """Show enhanced charts including scatter plots"""
+        """
+        Show enhanced charts including scatter plots
+        
+        Only the selected tab's figures are built; switching tabs reruns just this fragment,
+        so the rest of the results stay on the page.
+        """
         st.markdown("---")
         st.header(get_text('distribution_charts_title', lang))
         
@@ -461,16 +539,19 @@ class ResultsDisplay:
             get_text('distributions_tab', lang),
             get_text('correlations_tab', lang),
             get_text('comparison_tab', lang)
-        ])
+        ], key='distribution_chart_tabs', on_change='rerun')
         
-        with tab1:
-            ResultsDisplay._show_distribution_charts(accumulation_nominal, accumulation_real, final_nominal, final_real, lang)
+        if tab1.open:
+            with tab1:
+                ResultsDisplay._show_distribution_charts(accumulation_nominal, accumulation_real, final_nominal, final_real, lang)
         
-        with tab2:
-            ResultsDisplay._show_correlation_charts(accumulation_nominal, final_nominal, lang)
+        if tab2.open:
+            with tab2:
+                ResultsDisplay._show_correlation_charts(accumulation_nominal, final_nominal, lang)
         
-        with tab3:
-            ResultsDisplay._show_comparison_charts(final_nominal, final_real, lang)
+        if tab3.open:
+            with tab3:
+                ResultsDisplay._show_comparison_charts(final_nominal, final_real, lang)
     
     @staticmethod
     def _show_distribution_charts(accumulation_nominal, accumulation_real, final_nominal, final_real, lang):
@@ -659,43 +740,13 @@ class ResultsDisplay:
         
         # Risk explanation
         with st.expander("ℹ️ " + ("Cosa sono VaR e CVaR?" if lang == 'it' else "What are VaR and CVaR?"), expanded=False):
-            if lang == 'it':
-                st.markdown("""
-                **📊 Value at Risk (VaR) al 5%:**
-                - Indica il valore minimo che il tuo portafoglio raggiungerà nel 95% dei casi
-                - Es: VaR 5% = €50.000 significa che solo nel 5% dei casi peggiori il portafoglio varrà meno di €50.000
-                
-                **📉 Conditional Value at Risk (CVaR) al 5%:**
-                - È il valore medio del portafoglio nei peggiori 5% degli scenari
-                - Es: CVaR 5% = €30.000 significa che quando le cose vanno davvero male, il portafoglio vale in media €30.000
-                
-                **🎯 Perché sono importanti:**
-                - Aiutano a comprendere i rischi estremi del tuo piano di investimento
-                - CVaR è sempre ≤ VaR e mostra quanto possono essere gravi le perdite estreme
-                - Utili per valutare se puoi tollerare gli scenari peggiori
-                """)
-            else:
-                st.markdown("""
-                **📊 Value at Risk (VaR) at 5%:**
-                - Indicates the minimum value your portfolio will reach in 95% of cases
-                - Ex: VaR 5% = €50,000 means that only in the worst 5% of cases will the portfolio be worth less than €50,000
-                
-                **📉 Conditional Value at Risk (CVaR) at 5%:**
-                - Is the average portfolio value in the worst 5% of scenarios
-                - Ex: CVaR 5% = €30,000 means when things go really bad, the portfolio averages €30,000
-                
-                **🎯 Why they matter:**
-                - Help understand extreme risks of your investment plan
-                - CVaR is always ≤ VaR and shows how severe extreme losses can be
-                - Useful for assessing whether you can tolerate worst-case scenarios
-                """)
+            st.markdown(_VAR_CVAR_EXPLANATION.get(lang, _VAR_CVAR_EXPLANATION['en']))
         
         # Calculate VaR and CVaR for different phases
         phases_data = {}
         
         if 'accumulation_nominal' in results:
-            acc_nom_var5 = ResultsDisplay.calculate_var(results['accumulation_nominal'], 0.95)
-            acc_nom_cvar5 = ResultsDisplay.calculate_cvar(results['accumulation_nominal'], 0.95)
+            acc_nom_var5, acc_nom_cvar5 = ResultsDisplay.calculate_var_cvar(results['accumulation_nominal'], 0.95)
             phases_data['accumulation_nominal'] = {
                 'name': 'Accumulo (Nominale)' if lang == 'it' else 'Accumulation (Nominal)',
                 'var5': acc_nom_var5,
@@ -704,8 +755,7 @@ class ResultsDisplay:
             }
         
         if 'accumulation' in results:
-            acc_real_var5 = ResultsDisplay.calculate_var(results['accumulation'], 0.95)
-            acc_real_cvar5 = ResultsDisplay.calculate_cvar(results['accumulation'], 0.95)
+            acc_real_var5, acc_real_cvar5 = ResultsDisplay.calculate_var_cvar(results['accumulation'], 0.95)
             phases_data['accumulation_real'] = {
                 'name': 'Accumulo (Reale)' if lang == 'it' else 'Accumulation (Real)',
                 'var5': acc_real_var5,
@@ -714,8 +764,7 @@ class ResultsDisplay:
             }
         
         if 'final' in results:
-            final_var5 = ResultsDisplay.calculate_var(results['final'], 0.95)
-            final_cvar5 = ResultsDisplay.calculate_cvar(results['final'], 0.95)
+            final_var5, final_cvar5 = ResultsDisplay.calculate_var_cvar(results['final'], 0.95)
             final_mean = np.mean(results['final'])
             phases_data['final'] = {
                 'name': 'Finale' if lang == 'it' else 'Final',
@@ -905,26 +954,29 @@ class ResultsDisplay:
             st.dataframe(df_var_cvar, use_container_width=True)
     
     @staticmethod
+    @st.fragment
     def _show_var_cvar_visualizations(results, phases_data, lang):
-        """Show VaR/CVaR visualizations"""
+        """Show VaR/CVaR visualizations (lazy tabs, as _show_enhanced_charts_with_scatter)"""
         st.subheader("📈 " + ("Visualizzazioni VaR e CVaR" if lang == 'it' else "VaR and CVaR Visualizations"))
         
         tab1, tab2 = st.tabs([
             "📊 " + ("Distribuzione con VaR/CVaR" if lang == 'it' else "Distribution with VaR/CVaR"),
             "📈 " + ("Confronto Fasi" if lang == 'it' else "Phase Comparison")
-        ])
-        
-        with tab1:
-            # CORRECTED: Use accumulation NOMINAL values for primary analysis
-            if 'accumulation_nominal' in results and 'accumulation_nominal' in phases_data:
-                ResultsDisplay._show_distribution_with_var_cvar_markers(results['accumulation_nominal'], phases_data['accumulation_nominal'], lang, "accumulation_nominal")
-            elif 'accumulation' in results and 'accumulation' in phases_data:
-                ResultsDisplay._show_distribution_with_var_cvar_markers(results['accumulation'], phases_data['accumulation'], lang, "accumulation")
-            elif 'final' in results and 'final' in phases_data:
-                ResultsDisplay._show_distribution_with_var_cvar_markers(results['final'], phases_data['final'], lang, "final")
-        
-        with tab2:
-            ResultsDisplay._show_var_cvar_comparison_chart(phases_data, lang)
+        ], key='var_cvar_chart_tabs', on_change='rerun')
+        
+        if tab1.open:
+            with tab1:
+                # Use accumulation NOMINAL values for primary analysis
+                if 'accumulation_nominal' in results and 'accumulation_nominal' in phases_data:
+                    ResultsDisplay._show_distribution_with_var_cvar_markers(results['accumulation_nominal'], phases_data['accumulation_nominal'], lang, "accumulation_nominal")
+                elif 'accumulation' in results and 'accumulation' in phases_data:
+                    ResultsDisplay._show_distribution_with_var_cvar_markers(results['accumulation'], phases_data['accumulation'], lang, "accumulation")
+                elif 'final' in results and 'final' in phases_data:
+                    ResultsDisplay._show_distribution_with_var_cvar_markers(results['final'], phases_data['final'], lang, "final")
+        
+        if tab2.open:
+            with tab2:
+                ResultsDisplay._show_var_cvar_comparison_chart(phases_data, lang)
     
     @staticmethod
     def _show_distribution_with_var_cvar_markers(final_values, final_data, lang, phase_type):
@@ -983,20 +1035,7 @@ class ResultsDisplay:
         st.plotly_chart(fig, use_container_width=True)
         
         # Add explanation
-        if lang == 'it':
-            st.info("""
-            **📖 Come leggere il grafico:**
-            - **Linea rossa tratteggiata (VaR 5%)**: Solo il 5% dei risultati è a sinistra di questa linea
-            - **Linea rossa continua (CVaR 5%)**: Valore medio di tutti i risultati a sinistra del VaR 5%
-            - **Linea verde punteggiata**: Valore medio di tutti gli scenari
-            """)
-        else:
-            st.info("""
-            **📖 How to read the chart:**
-            - **Red dashed line (VaR 5%)**: Only 5% of results are to the left of this line
-            - **Red solid line (CVaR 5%)**: Average value of all results to the left of VaR 5%
-            - **Green dotted line**: Average value across all scenarios
-            """)
+        st.info(_DISTRIBUTION_CHART_HELP.get(lang, _DISTRIBUTION_CHART_HELP['en']))
     
     @staticmethod
     def _show_var_cvar_comparison_chart(phases_data, lang):
@@ -0,0 +1,453 @@
+"""
+Vectorized kernels for the Monte Carlo simulators
+Numba is optional: simulate_paths falls back to a NumPy implementation without it
+"""
+
+import os
+import time
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Dict
+
+try:
+    from numba import njit, prange
+    NUMBA_AVAILABLE = True
+except ImportError:
+    NUMBA_AVAILABLE = False
+
+# Paths simulated per batch; keeps the (paths, years, assets) draws and the lot matrices small
+CHUNK_PATHS = 8192
+# Minimum seconds between progress updates from the batch loop
+PROGRESS_INTERVAL = 0.1
+
+
+class SimulationCancelled(Exception):
+    """Raised by run_chunked when the caller's cancel event is set"""
+
+
+# Packed array name and source dict key (in percent) for every per-asset field
+ASSET_FIELDS = (
+    ('mean_returns', 'return'),
+    ('volatilities', 'volatility'),
+    ('allocations', 'allocation'),
+    ('min_returns', 'min_return'),
+    ('max_returns', 'max_return'),
+    ('ters', 'ter'),
+)
+
+
+def pack_assets(assets):
+    """
+    Flatten a list of asset dicts into per-field arrays, converting percents to decimals
+
+    The fields are read-only row views of one contiguous (fields, assets) float64 block,
+    also returned as 'field_block'. Already packed input is returned unchanged, so
+    callers can pack once up front.
+    """
+    if isinstance(assets, dict):
+        return assets
+
+    field_block = np.empty((len(ASSET_FIELDS), len(assets)))
+    for row, (_, key) in zip(field_block, ASSET_FIELDS):
+        row[:] = np.fromiter((asset[key] for asset in assets), dtype=np.float64, count=len(assets))
+    field_block /= 100
+    field_block.setflags(write=False)
+
+    packed = {'names': [asset['name'] for asset in assets], 'field_block': field_block}
+    packed.update(zip((name for name, _ in ASSET_FIELDS), field_block))
+    return packed
+
+
+def portfolio_returns(asset_returns, allocations, min_returns, max_returns, ters):
+    """
+    Collapse per-asset annual returns into portfolio returns
+
+    The per-asset caps keep the portfolio return from collapsing to a single normal draw,
+    but the TER is linear, so it is folded into one allocation-weighted scalar.
+
+    Args:
+        asset_returns: Array of shape (..., n_assets) with raw annual returns; it is
+            capped in place, so pass a scratch array
+        allocations, min_returns, max_returns, ters: Per-asset decimals
+
+    Returns:
+        Array of shape (...) with capped, net-of-TER, allocation-weighted returns,
+        in the same precision as asset_returns
+    """
+    dtype = asset_returns.dtype
+    allocations = np.asarray(allocations, dtype=dtype)
+    np.minimum(asset_returns, np.asarray(max_returns, dtype=dtype), out=asset_returns)
+    np.maximum(asset_returns, np.asarray(min_returns, dtype=dtype), out=asset_returns)
+    portfolio = asset_returns @ allocations
+    portfolio -= np.vdot(np.asarray(ters, dtype=dtype), allocations)
+    return portfolio
+
+
+@lru_cache(maxsize=64)
+def inflation_factors(inflation, n_years):
+    """Read-only (1 + inflation) ** [0, n_years), shared by the schedules across runs"""
+    factors = (1 + inflation) ** np.arange(int(n_years), dtype=np.float64)
+    factors.setflags(write=False)
+    return factors
+
+
+def contribution_schedule(initial_amount, years_to_retirement, annual_contribution,
+                          adjust_contribution_inflation, inflation):
+    """
+    Amount invested at each point of the accumulation phase
+
+    Index 0 is the initial amount; index y is the contribution added after year y's return.
+    """
+    years = int(years_to_retirement)
+    contributions = np.empty(years + 1)
+    contributions[0] = initial_amount
+    if adjust_contribution_inflation:
+        contributions[1:] = annual_contribution * inflation_factors(inflation, years)
+    else:
+        contributions[1:] = annual_contribution
+    return np.maximum(contributions, 0.0)
+
+
+def withdrawal_schedule(base_withdrawal, years_to_retirement, years_retired, inflation, use_real_withdrawal):
+    """Target gross withdrawal for each retirement year (real keeps purchasing power from today)"""
+    if use_real_withdrawal:
+        start = int(years_to_retirement)
+        return base_withdrawal * inflation_factors(inflation, start + int(years_retired))[start:]
+    return np.full(int(years_retired), float(base_withdrawal))
+
+
+if NUMBA_AVAILABLE:
+    @njit(fastmath=True, cache=True, nogil=True)
+    def _retire_path(values, basis, returns, withdrawals, tax_rate, progression):
+        """
+        Withdrawal/tax recursion for one path; mirrors EnhancedTaxEngine's proportional method
+
+        Updates the path's lot values, basis and withdrawal progression in place and
+        returns (withdrawn, taxes, gains, net, withdrawal_years).
+        """
+        n_lots = values.shape[0]
+        withdrawn = 0.0
+        taxes = 0.0
+        gains = 0.0
+        net = 0.0
+        withdrawal_years = 0
+
+        for year in range(returns.shape[0]):
+            # Grow, then withdraw proportionally from every active lot
+            growth = 1.0 + returns[year]
+            total = 0.0
+            for lot in range(n_lots):
+                if values[lot] > 0:
+                    values[lot] *= growth
+                total += values[lot]
+            if total <= 0:
+                break
+
+            amount = min(withdrawals[year], total)
+            fraction = amount / total
+            realized = 0.0
+            for lot in range(n_lots):
+                if values[lot] > 0:
+                    if values[lot] > basis[lot]:
+                        realized += (values[lot] - basis[lot]) * fraction
+                    values[lot] *= 1.0 - fraction
+                    basis[lot] *= 1.0 - fraction
+
+            tax = realized * tax_rate
+            withdrawn += amount
+            taxes += tax
+            gains += realized
+            net += max(0.0, amount - tax)
+            progression[year] = amount
+            withdrawal_years += 1
+
+            # A withdrawal that takes the whole balance depletes the path: it ends at exactly
+            # zero (a failure for the success rate) and withdraws nothing in later years
+            if amount >= total:
+                values[:] = 0.0
+                break
+
+        return withdrawn, taxes, gains, net, withdrawal_years
+
+    @njit(parallel=True, fastmath=True, cache=True, nogil=True)
+    def _simulate_paths_numba(acc_returns, ret_returns, contributions, withdrawals, tax_rate):
+        """Per-path tax-lot recursion, parallel across paths"""
+        n_paths, n_acc = acc_returns.shape
+        n_ret = ret_returns.shape[1]
+        n_lots = contributions.shape[0]
+
+        accumulation = np.zeros(n_paths)
+        final = np.zeros(n_paths)
+        withdrawn = np.zeros(n_paths)
+        taxes = np.zeros(n_paths)
+        gains = np.zeros(n_paths)
+        net = np.zeros(n_paths)
+        withdrawal_years = np.zeros(n_paths, dtype=np.int64)
+        progression = np.zeros((n_paths, n_ret), dtype=np.float32)
+
+        # One allocation for every path's lots instead of two per prange iteration
+        values = np.zeros((n_paths, n_lots))
+        basis = np.zeros((n_paths, n_lots))
+
+        for path in prange(n_paths):
+            path_values = values[path]
+            path_basis = basis[path]
+            path_basis[:] = contributions
+
+            # Accumulation: lot y ends at contributions[y] times the growth of years
+            # y..n_acc-1, so one backward pass builds every lot (as the NumPy kernel's cumprod)
+            path_values[n_acc] = contributions[n_acc]
+            suffix = 1.0
+            wiped = False
+            for year in range(n_acc - 1, -1, -1):
+                growth = 1.0 + acc_returns[path, year]
+                if growth <= 0:
+                    wiped = True
+                    break
+                suffix *= growth
+                path_values[year] = contributions[year] * suffix
+
+            # A lot stops growing once it is no longer positive; replay such paths year by year
+            if wiped:
+                path_values[:] = 0.0
+                path_values[0] = contributions[0]
+                for year in range(n_acc):
+                    growth = 1.0 + acc_returns[path, year]
+                    for lot in range(year + 1):
+                        if path_values[lot] > 0:
+                            path_values[lot] *= growth
+                    path_values[year + 1] = contributions[year + 1]
+            accumulation[path] = path_values.sum()
+
+            path_withdrawn, path_taxes, path_gains, path_net, path_years = _retire_path(
+                path_values, path_basis, ret_returns[path], withdrawals, tax_rate, progression[path]
+            )
+            withdrawn[path] = path_withdrawn
+            taxes[path] = path_taxes
+            gains[path] = path_gains
+            net[path] = path_net
+            withdrawal_years[path] = path_years
+            final[path] = path_values.sum()
+
+        return accumulation, final, withdrawn, taxes, gains, net, withdrawal_years, progression
+
+
+def _simulate_paths_numpy(acc_returns, ret_returns, contributions, withdrawals, tax_rate):
+    """Same recursion as the Numba kernel, vectorized across paths with one loop over years"""
+    n_paths, n_acc = acc_returns.shape
+    n_ret = ret_returns.shape[1]
+    n_lots = contributions.shape[0]
+
+    # Accumulation: lot y grows in years y..n_acc-1, so it ends at contributions[y] times
+    # the suffix product of the growth factors (one reversed cumprod instead of a triangle of multiplies)
+    growth = np.add(acc_returns, 1.0, dtype=np.float64)
+    suffix_growth = np.ones((n_paths, n_lots))
+    suffix_growth[:, :n_acc] = np.cumprod(growth[:, ::-1], axis=1)[:, ::-1]
+    values = contributions * suffix_growth
+
+    # A lot stops growing once it is no longer positive; replay the rare paths with a
+    # return of -100% or worse year by year
+    replay = np.flatnonzero((growth <= 0).any(axis=1))
+    if replay.size:
+        replayed = np.zeros((replay.size, n_lots))
+        replayed[:, 0] = contributions[0]
+        for year in range(n_acc):
+            open_lots = replayed[:, :year + 1]
+            np.multiply(open_lots, growth[replay, year, None], out=open_lots, where=open_lots > 0)
+            replayed[:, year + 1] = contributions[year + 1]
+        values[replay] = replayed
+    accumulation = values.sum(axis=1)
+    basis = np.tile(contributions, (n_paths, 1))
+
+    withdrawn = np.zeros(n_paths)
+    taxes = np.zeros(n_paths)
+    gains = np.zeros(n_paths)
+    net = np.zeros(n_paths)
+    withdrawal_years = np.zeros(n_paths, dtype=np.int64)
+    progression = np.zeros((n_paths, n_ret), dtype=np.float32)
+    alive = np.ones(n_paths, dtype=bool)
+
+    # Retirement: grow, then withdraw the same fraction from every active lot
+    for year in range(n_ret):
+        np.multiply(values, np.add(ret_returns[:, year, None], 1.0, dtype=np.float64), out=values,
+                    where=(values > 0) & alive[:, None])
+        total = values.sum(axis=1)
+        alive &= total > 0
+        if not alive.any():
+            break
+
+        amount = np.where(alive, np.minimum(withdrawals[year], total), 0.0)
+        fraction = np.divide(amount, total, out=np.zeros(n_paths), where=alive)
+        active_lots = values > 0
+        realized = fraction * np.where(active_lots, np.maximum(values - basis, 0.0), 0.0).sum(axis=1)
+        remaining = np.where(active_lots, 1.0 - fraction[:, None], 1.0)
+        values *= remaining
+        basis *= remaining
+
+        # Depleted paths end at exactly zero, as in _retire_path: rounding can leave a
+        # fractional balance after the last withdrawal, which would count as a success
+        # and keep adding near-zero withdrawal years
+        depleted = alive & (amount >= total)
+        values[depleted] = 0.0
+
+        tax = realized * tax_rate
+        withdrawn += amount
+        taxes += tax
+        gains += realized
+        net += np.maximum(0.0, amount - tax)
+        progression[:, year] = amount
+        withdrawal_years += alive
+        alive &= ~depleted
+
+    return accumulation, values.sum(axis=1), withdrawn, taxes, gains, net, withdrawal_years, progression
+
+
+def _returns_array(returns):
+    """Contiguous returns array; float32 draws are kept as float32 instead of copied up to float64"""
+    returns = np.asarray(returns)
+    dtype = returns.dtype if returns.dtype in (np.float32, np.float64) else np.float64
+    return np.ascontiguousarray(returns, dtype=dtype)
+
+
+def simulate_paths(acc_returns, ret_returns, contributions, withdrawals, tax_rate) -> Dict[str, np.ndarray]:
+    """
+    Run the accumulation/withdrawal recursion for every path
+
+    Uses the Numba kernel when available and the vectorized NumPy version otherwise.
+
+    Args:
+        acc_returns: (n_paths, years_to_retirement) nominal portfolio returns
+        ret_returns: (n_paths, years_retired) real portfolio returns
+        contributions: Output of contribution_schedule
+        withdrawals: Output of withdrawal_schedule
+        tax_rate: Capital gains tax rate as decimal
+
+    Returns may come in as float32 and are passed to the kernels as is; each growth
+    factor is formed in float64, and balances and tax totals are accumulated in float64.
+    The (paths, years) withdrawal progression, which is only reduced to a per-year
+    median, is stored as float32.
+    The Numba kernel releases the GIL, so it can run on a worker thread alongside the UI.
+    """
+    kernel = _simulate_paths_numba if NUMBA_AVAILABLE else _simulate_paths_numpy
+    (accumulation, final, withdrawn, taxes, gains, net,
+     withdrawal_years, progression) = kernel(
+        _returns_array(acc_returns),
+        _returns_array(ret_returns),
+        np.ascontiguousarray(contributions, dtype=np.float64),
+        np.ascontiguousarray(withdrawals, dtype=np.float64),
+        float(tax_rate)
+    )
+    return {
+        'accumulation_nominal': accumulation,
+        'final': final,
+        'total_withdrawals': withdrawn,
+        'total_taxes_paid': taxes,
+        'total_capital_gains_realized': gains,
+        'total_net_withdrawals': net,
+        'withdrawal_years': withdrawal_years,
+        'withdrawal_progression': progression
+    }
+
+
+def warm_up():
+    """
+    Compile (or load from the on-disk cache) the Numba kernel for float32 draws
+
+    Run once at startup so the first simulation does not pay the JIT cost; a no-op
+    without Numba.
+    """
+    if not NUMBA_AVAILABLE:
+        return
+    returns = np.zeros((4, 2), dtype=np.float32)
+    simulate_paths(returns, returns, np.ones(3), np.ones(2), 0.0)
+
+
+def path_chunks(n_paths, chunk_size=CHUNK_PATHS):
+    """Yield the number of paths in each consecutive simulation batch"""
+    for start in range(0, n_paths, chunk_size):
+        yield min(chunk_size, n_paths - start)
+
+
+def concat_paths(chunks):
+    """Join per-batch simulate_paths outputs along the path axis"""
+    if len(chunks) == 1:
+        return chunks[0]
+    return {key: np.concatenate([chunk[key] for chunk in chunks]) for key in chunks[0]}
+
+
+def run_chunked(simulate_chunk, n_simulations, rng, progress_bar=None):
+    """
+    Run simulate_chunk(n_paths, rng) over every path batch and join the outputs
+
+    Each batch draws from its own child generator spawned off rng, so the results do not
+    depend on how many batches run at once. Without Numba the batches share a thread pool
+    (the heavy NumPy calls release the GIL); the Numba kernel already spreads each batch
+    across cores, so then they run one after another. Progress is reported at most once per
+    PROGRESS_INTERVAL; the simulators set the bar to 1.0 themselves when they finish.
+
+    A progress_bar with a cancel_event (a threading.Event) stops the run between batches:
+    the batches not yet started are dropped and SimulationCancelled is raised.
+    """
+    sizes = list(path_chunks(n_simulations))
+    workers = 1 if NUMBA_AVAILABLE else min(len(sizes), os.cpu_count() or 1)
+    cancel_event = getattr(progress_bar, 'cancel_event', None)
+    chunks = []
+    done = 0
+    last_update = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='paths') as executor:
+        for n_paths, chunk in zip(sizes, executor.map(simulate_chunk, sizes, rng.spawn(len(sizes)))):
+            if cancel_event is not None and cancel_event.is_set():
+                executor.shutdown(wait=False, cancel_futures=True)
+                raise SimulationCancelled()
+            chunks.append(chunk)
+            done += n_paths
+            now = time.monotonic()
+            if progress_bar and now - last_update >= PROGRESS_INTERVAL:
+                progress_bar.progress(done / n_simulations)
+                last_update = now
+    return concat_paths(chunks)
+
+
+def build_results(paths, contributions, years_to_retirement, years_retired, inflation,
+                  base_withdrawal, use_real_withdrawal):
+    """Repack kernel output arrays into the simulators' results dictionary"""
+    accumulation_nominal = paths['accumulation_nominal']
+    withdrawal_years = paths['withdrawal_years']
+    total_contributions = float(contributions[contributions > 0].sum())
+
+    # Same cached vector withdrawal_schedule indexes, so no powers are recomputed here
+    n_acc = int(years_to_retirement)
+    n_ret = int(years_retired)
+    factors = inflation_factors(inflation, n_acc + max(n_ret, 1))
+    final_withdrawal = (base_withdrawal * factors[n_acc + n_ret - 1]
+                        if use_real_withdrawal and n_ret > 0 else base_withdrawal)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        real_withdrawals = np.where(withdrawal_years > 0,
+                                    paths['total_net_withdrawals'] / withdrawal_years, base_withdrawal)
+        average_annual_tax = np.where(withdrawal_years > 0,
+                                      paths['total_taxes_paid'] / withdrawal_years, 0.0)
+
+    # Columnar per-path totals; the (paths, years) withdrawal matrix is reduced to a per-year median
+    tax_details = {
+        'total_contributions': total_contributions,
+        'total_withdrawals': paths['total_withdrawals'],
+        'total_taxes_paid': paths['total_taxes_paid'],
+        'total_capital_gains_realized': paths['total_capital_gains_realized'],
+        'average_annual_tax': average_annual_tax,
+        'total_years_with_withdrawals': withdrawal_years,
+        'median_withdrawal_progression': np.median(paths['withdrawal_progression'], axis=0),
+        'use_real_withdrawal': use_real_withdrawal,
+        'base_withdrawal': base_withdrawal,
+        'final_withdrawal': final_withdrawal
+    }
+
+    return {
+        'accumulation': (accumulation_nominal / factors[n_acc]).tolist(),
+        'accumulation_nominal': accumulation_nominal.tolist(),
+        'final': paths['final'].tolist(),
+        'real_withdrawal': real_withdrawals.tolist(),
+        'tax_details': tax_details,
+        'use_real_withdrawal': use_real_withdrawal
+    }
@@ -2,6 +2,8 @@
  translations for Monte Carlo Investment Simulator
 """
 
+from functools import lru_cache
+
 TRANSLATIONS = {
     'en': {
         # Header and title
@@ -38,6 +40,7 @@ TRANSLATIONS = {
         # Sidebar parameters
         'simulation_parameters': 'Simulation Parameters',
         'general_parameters': 'General Parameters',
+        'apply_parameters': 'Apply Parameters',
         'initial_amount': 'Initial amount (€)',
         'years_to_retirement': 'Years to retirement',
         'years_retired': 'Years in retirement',
@@ -49,7 +52,7 @@ TRANSLATIONS = {
         # Real withdrawal parameters
         'withdrawal_section_title': 'Retirement Withdrawal Settings',
         'use_real_withdrawal': 'Use REAL withdrawal (recommended)',
-        'use_real_withdrawal_help': 'If checked, withdrawal amount maintains constant purchasing power by adjusting for inflation. If unchecked, uses fixed nominal amount that loses purchasing power over time.',
+        'use_real_withdrawal_help': 'If checked, withdrawal amount maintains constant purchasing power by adjusting for inflation. If unchecked, uses fixed nominal amount that loses purchasing power over time. The withdrawal label and explanation below update when the parameters are applied.',
         'real_withdrawal_amount': 'Annual REAL withdrawal (€ in today\'s purchasing power)',
         'real_withdrawal_help': 'This amount represents TODAY\'S purchasing power. At retirement, it will be automatically adjusted for inflation during accumulation, then continue adjusting annually. Example: €12,000 today → €22,235 at retirement (after 25 years at 2.5%) → €22,791 in year 2, etc.',
         'nominal_withdrawal_amount': 'Annual NOMINAL withdrawal (€ fixed amount)',
@@ -61,6 +64,8 @@ TRANSLATIONS = {
         'capital_gains_tax_rate': 'Capital gains tax rate (%)',
         'capital_gains_tax_help': 'Tax rate applied to capital gains portion of withdrawals. The effective withdrawal amount will be reduced based on the capital gains percentage in your portfolio.',
         'n_simulations': 'Number of simulations',
+        'random_seed': 'Random seed',
+        'random_seed_help': 'Use the same non-zero seed to reproduce a run exactly. 0 draws new random numbers for each run.',
         
         # Portfolio configuration
         'portfolio_config': 'Portfolio Configuration',
@@ -196,6 +201,21 @@ TRANSLATIONS = {
         'average_value_when_loss': 'Average Value (when loss occurs)',
         'probability_by_threshold': 'Probability by Threshold:',
         'loss_probability_by_threshold': 'Loss Probability by Threshold',
+        
+        # Correlation settings and run banners
+        'correlation_settings': 'Advanced Correlation Settings',
+        'close': 'Close',
+        'new_features': 'New Features',
+        'new_features_text': 'This version includes REAL withdrawals that maintain purchasing power and integrated VaR/CVaR analysis!',
+        'risk_analysis': 'Integrated Risk Analysis',
+        'risk_analysis_text': 'VaR and CVaR at 5% now integrated directly in the app to assess extreme risks!',
+        'asset_correlation': 'Asset Correlation',
+        'scenario': 'Scenario:',
+        'advanced_settings': 'Advanced Settings',
+        'correlation_fallback': 'Correlated simulation failed, used the standard one',
+        'real_withdrawal_used': 'Used REAL withdrawal (inflation-adjusted)',
+        'nominal_withdrawal_used': 'Used NOMINAL withdrawal (fixed amount)',
+        'var_cvar_integrated': 'VaR/CVaR analysis integrated in results',
     },
     
     'it': {
@@ -233,6 +253,7 @@ TRANSLATIONS = {
         # Sidebar parameters
         'simulation_parameters': 'Parametri di Simulazione',
         'general_parameters': 'Parametri Generali',
+        'apply_parameters': 'Applica Parametri',
         'initial_amount': 'Importo iniziale (€)',
         'years_to_retirement': 'Anni alla pensione',
         'years_retired': 'Anni in pensione',
@@ -244,7 +265,7 @@ TRANSLATIONS = {
         # Real withdrawal parameters
         'withdrawal_section_title': 'Impostazioni Prelievi Pensione',
         'use_real_withdrawal': 'Usa prelievo REALE (raccomandato)',
-        'use_real_withdrawal_help': 'Se selezionato, l\'importo del prelievo mantiene potere d\'acquisto costante aggiustandosi per l\'inflazione. Se non selezionato, usa un importo nominale fisso che perde potere d\'acquisto nel tempo.',
+        'use_real_withdrawal_help': 'Se selezionato, l\'importo del prelievo mantiene potere d\'acquisto costante aggiustandosi per l\'inflazione. Se non selezionato, usa un importo nominale fisso che perde potere d\'acquisto nel tempo. Etichetta e spiegazione del prelievo si aggiornano quando i parametri vengono applicati.',
         'real_withdrawal_amount': 'Prelievo annuale REALE (€ in potere d\'acquisto di oggi)',
         'real_withdrawal_help': 'Questo importo rappresenta il potere d\'acquisto di OGGI. Al pensionamento, sarà automaticamente aggiustato per l\'inflazione durante l\'accumulo, poi continuerà ad aggiustarsi annualmente. Esempio: €12.000 oggi → €22.235 al pensionamento (dopo 25 anni al 2.5%) → €22.791 nel secondo anno, ecc.',
         'nominal_withdrawal_amount': 'Prelievo annuale NOMINALE (€ importo fisso)',
@@ -256,6 +277,8 @@ TRANSLATIONS = {
         'capital_gains_tax_rate': 'Aliquota tassazione capital gain (%)',
         'capital_gains_tax_help': 'Aliquota fiscale applicata alla porzione di capital gain dei prelievi. L\'importo effettivo del prelievo sarà ridotto in base alla percentuale di capital gain nel portafoglio.',
         'n_simulations': 'Numero di simulazioni',
+        'random_seed': 'Seme casuale',
+        'random_seed_help': 'Usa lo stesso seme diverso da zero per riprodurre esattamente una simulazione. 0 genera nuovi numeri casuali a ogni simulazione.',
         
         # Portfolio configuration
         'portfolio_config': 'Configurazione Portafoglio',
@@ -391,84 +414,125 @@ TRANSLATIONS = {
         'average_value_when_loss': 'Valore Medio (quando c\'è perdita)',
         'probability_by_threshold': 'Probabilità per Soglia:',
         'loss_probability_by_threshold': 'Probabilità di Perdita per Soglia',
+        
+        # Correlation settings and run banners
+        'correlation_settings': 'Impostazioni Avanzate Correlazione',
+        'close': 'Chiudi',
+        'new_features': 'Nuove Funzionalità',
+        'new_features_text': 'Questa versione include prelievi REALI che mantengono il potere d\'acquisto e analisi VaR/CVaR integrata!',
+        'risk_analysis': 'Analisi del Rischio Integrata',
+        'risk_analysis_text': 'VaR e CVaR al 5% ora integrati direttamente nell\'app per valutare i rischi estremi!',
+        'asset_correlation': 'Correlazione Asset',
+        'scenario': 'Scenario:',
+        'advanced_settings': 'Impostazioni Avanzate',
+        'correlation_fallback': 'Simulazione con correlazione fallita, usata quella standard',
+        'real_withdrawal_used': 'Utilizzato prelievo REALE (aggiustato per inflazione)',
+        'nominal_withdrawal_used': 'Utilizzato prelievo NOMINALE (importo fisso)',
+        'var_cvar_integrated': 'Analisi VaR/CVaR integrata nei risultati',
+    }
+}
+
+# Correlation scenario labels for the sidebar selector
+SCENARIO_NAMES = {
+    'en': {
+        'normal_times': 'Normal Markets',
+        'crisis_times': 'Financial Crisis',
+        'independent': 'Independent Assets',
+        'defensive': 'Defensive Scenario',
+        'high_inflation': 'High Inflation'
+    },
+    'it': {
+        'normal_times': 'Mercati Normali',
+        'crisis_times': 'Crisi Finanziaria',
+        'independent': 'Asset Indipendenti',
+        'defensive': 'Scenario Difensivo',
+        'high_inflation': 'Alta Inflazione'
+    }
+}
+
+# Investment profile labels for the profile selectors
+PROFILE_NAMES = {
+    'en': {
+        'Protective': 'Protective',
+        'Conservative': 'Conservative',
+        'Moderate': 'Moderate', 
+        'Dynamic': 'Dynamic',
+        'Aggressive': 'Aggressive',
+        'StrategicAccumulation': 'Growth Dynamic',
+        'Diversified': 'Diversified',
+        'StrategicDecumulation': 'Income Dynamic',
+        'UserDefined': 'User Defined'
+    },
+    'it': {
+        'Protective': 'Protettivo',
+        'Conservative': 'Conservativo',
+        'Moderate': 'Moderato',
+        'Dynamic': 'Dinamico', 
+        'Aggressive': 'Aggressivo',
+        'StrategicAccumulation': 'Crescita Dinamica',
+        'Diversified': 'Diversificato',
+        'StrategicDecumulation': 'Rendita Dinamica',            
+        'UserDefined': 'Allocazione Utente'
+    }
+}
+
+# Asset labels for the editors and summaries
+ASSET_NAMES = {
+    'en': {
+        'Stocks': 'Stocks',
+        'Bond': 'Bonds',
+        'Gold': 'Gold',
+        'REIT': 'REIT',
+        'Commodities': 'Commodities',
+        'Cash': 'Cash',
+        'IlMattone': 'Real Estate',
+        'UserAsset': 'User Custom',
+        'UserAsset1': 'User Asset 1',
+        'UserAsset2': 'User Asset 2'
+    },
+    'it': {
+        'Stocks': 'Azioni',
+        'Bond': 'Obbligazioni', 
+        'Gold': 'Oro',
+        'REIT': 'Immobiliare',
+        'Commodities': 'Materie Prime',
+        'Cash': 'Liquidità',
+        'IlMattone': 'Il Mattone',
+        'UserAsset': 'Asset Custom',
+        'UserAsset1': 'Asset Utente 1',
+        'UserAsset2': 'Asset Utente 2'
     }
 }
 
+@lru_cache(maxsize=None)
+def _lookup_text(key, lang):
+    """Resolve the raw template for (key, lang), falling back to English (bounded by keys x languages)"""
+    try:
+        return TRANSLATIONS[lang][key]
+    except KeyError:
+        try:
+            return TRANSLATIONS['en'][key]
+        except KeyError:
+            return f"[MISSING: {key}]"
+
 def get_text(key, lang='en', **kwargs):
     """
     Get translated text for the given key and language.
     Supports string formatting with kwargs.
     """
-    try:
-        text = TRANSLATIONS[lang][key]
-        if kwargs:
-            return text.format(**kwargs)
+    text = _lookup_text(key, lang)
+    if not kwargs or text.startswith("[MISSING: "):
         return text
-    except KeyError:
-        # Fallback to English if translation not found
-        try:
-            text = TRANSLATIONS['en'][key]
-            if kwargs:
-                return text.format(**kwargs)
-            return text
-        except KeyError:
-            return f"[MISSING: {key}]"
+    return text.format(**kwargs)
+
+def get_scenario_names(lang='en'):
+    """Get translated correlation scenario names"""
+    return SCENARIO_NAMES.get(lang, SCENARIO_NAMES['en'])
 
 def get_profile_names(lang='en'):
     """Get translated profile names"""
-    profiles = {
-        'en': {
-            'Protective': 'Protective',
-            'Conservative': 'Conservative',
-            'Moderate': 'Moderate', 
-            'Dynamic': 'Dynamic',
-            'Aggressive': 'Aggressive',
-            'StrategicAccumulation': 'Growth Dynamic',
-            'Diversified': 'Diversified',
-            'StrategicDecumulation': 'Income Dynamic',
-            'UserDefined': 'User Defined'
-        },
-        'it': {
-            'Protective': 'Protettivo',
-            'Conservative': 'Conservativo',
-            'Moderate': 'Moderato',
-            'Dynamic': 'Dinamico', 
-            'Aggressive': 'Aggressivo',
-            'StrategicAccumulation': 'Crescita Dinamica',
-            'Diversified': 'Diversificato',
-            'StrategicDecumulation': 'Rendita Dinamica',            
-            'UserDefined': 'Allocazione Utente'
-        }
-    }
-    return profiles.get(lang, profiles['en'])
+    return PROFILE_NAMES.get(lang, PROFILE_NAMES['en'])
 
 def get_asset_names(lang='en'):
     """Get translated asset names"""
-    assets = {
-        'en': {
-            'Stocks': 'Stocks',
-            'Bond': 'Bonds',
-            'Gold': 'Gold',
-            'REIT': 'REIT',
-            'Commodities': 'Commodities',
-            'Cash': 'Cash',
-            'IlMattone': 'Real Estate',
-            'UserAsset': 'User Custom',
-            'UserAsset1': 'User Asset 1',
-            'UserAsset2': 'User Asset 2'
-        },
-        'it': {
-            'Stocks': 'Azioni',
-            'Bond': 'Obbligazioni', 
-            'Gold': 'Oro',
-            'REIT': 'Immobiliare',
-            'Commodities': 'Materie Prime',
-            'Cash': 'Liquidità',
-            'IlMattone': 'Il Mattone',
-            'UserAsset': 'Asset Custom',
-            'UserAsset1': 'Asset Utente 1',
-            'UserAsset2': 'Asset Utente 2'
-        }
-    }
-    return assets.get(lang, assets['en'])
-
+    return ASSET_NAMES.get(lang, ASSET_NAMES['en'])
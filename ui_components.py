@@ -7,9 +7,68 @@ import streamlit as st
 import pandas as pd
 import plotly.express as px
 import numpy as np
+from functools import lru_cache
 from translations import get_text, get_profile_names, get_asset_names
 
 
+@st.cache_data(show_spinner=False)
+def _build_allocation_pie(names, allocations, title):
+    """Build the allocation pie figure, cached on the (name, allocation) pairs"""
+    df_alloc = pd.DataFrame({'Asset': list(names), 'Allocation': list(allocations)})
+    fig_pie = px.pie(
+        df_alloc, 
+        values='Allocation', 
+        names='Asset', 
+        title=title
+    )
+    fig_pie.update_layout(height=400)
+    return fig_pie
+
+
+@st.cache_data(show_spinner=False)
+def _build_summary_frame(names, allocations, allocation_label):
+    """Build the asset summary table, cached on the (name, allocation) pairs"""
+    return pd.DataFrame({'Asset': list(names), allocation_label: list(allocations)})
+
+
+# Disclaimer sections in display order: educational purpose, long-term focus, asset return
+# assumptions, correlation limitations, real withdrawal explanation, data information
+_DISCLAIMER_KEYS = (
+    'educational_disclaimer', 'educational_text', 'app_explanation',
+    'long_term_disclaimer', 'long_term_text',
+    'returns_disclaimer', 'returns_text',
+    'correlation_disclaimer', 'correlation_text',
+    'real_withdrawal_disclaimer', 'real_withdrawal_text',
+    'data_info', 'data_text',
+)
+
+
+@lru_cache(maxsize=None)
+def _disclaimers_markdown(lang):
+    """Every disclaimer section joined into one markdown block, built once per language"""
+    return "\n\n".join([get_text(key, lang) for key in _DISCLAIMER_KEYS] + ["---"])
+
+
+@lru_cache(maxsize=None)
+def _profile_labels(profile_keys, lang):
+    """Profile keys and their translated selector labels, built once per profile set and language"""
+    profile_names = get_profile_names(lang)
+    return profile_keys, tuple(profile_names.get(key, key) for key in profile_keys)
+
+
+@st.fragment
+def _disclaimers_fragment(lang):
+    """
+    Disclaimers expander whose text is only sent while it is open
+
+    Opening or closing it reruns just this fragment, so results already on the page stay.
+    """
+    disclaimers = st.expander(get_text('disclaimers_header', lang), key='disclaimers_expander',
+                              on_change='rerun')
+    if disclaimers.open:
+        disclaimers.markdown(_disclaimers_markdown(lang))
+
+
 class UIComponents:
     """Collection of reusable UI components with enhanced disclaimers and real withdrawal"""
     
@@ -35,32 +94,7 @@ class UIComponents:
     @staticmethod
     def render_disclaimers(lang):
         """Render enhanced disclaimers section with long-term focus, return assumptions, and correlation limitations"""
-        with st.expander(get_text('disclaimers_header', lang)):
-            # Educational purpose disclaimer
-            st.markdown(get_text('educational_disclaimer', lang))
-            st.markdown(get_text('educational_text', lang))
-            st.markdown(get_text('app_explanation', lang))
-            
-            # NEW: Long-term investment focus
-            st.markdown(get_text('long_term_disclaimer', lang))
-            st.markdown(get_text('long_term_text', lang))
-            
-            # NEW: Asset return assumptions
-            st.markdown(get_text('returns_disclaimer', lang))
-            st.markdown(get_text('returns_text', lang))
-            
-            # NEW: Asset correlation limitations
-            st.markdown(get_text('correlation_disclaimer', lang))
-            st.markdown(get_text('correlation_text', lang))
-            
-            # NEW: Real withdrawal explanation
-            st.markdown(get_text('real_withdrawal_disclaimer', lang))
-            st.markdown(get_text('real_withdrawal_text', lang))
-            
-            # Data information
-            st.markdown(get_text('data_info', lang))
-            st.markdown(get_text('data_text', lang))
-            st.markdown("---")
+        _disclaimers_fragment(lang)
     
     @staticmethod
     def render_general_parameters(lang):
@@ -137,6 +171,12 @@ class UIComponents:
             [1000, 5000, 10000], index=2
         )
         
+        params['seed'] = int(st.number_input(
+            get_text('random_seed', lang),
+            value=0, min_value=0, step=1,
+            help=get_text('random_seed_help', lang)
+        ))
+        
         return params
     
     @staticmethod
@@ -164,9 +204,7 @@ class UIComponents:
     @staticmethod
     def render_profile_selector(asset_profiles, lang, phase='accumulation'):
         """Render investment profile selector for specific phase"""
-        profile_names = get_profile_names(lang)
-        profile_keys = list(asset_profiles.keys())
-        profile_display_names = [profile_names.get(key, key) for key in profile_keys]
+        profile_keys, profile_display_names = _profile_labels(tuple(asset_profiles), lang)
         
         if phase == 'accumulation':
             title = get_text('accumulation_profile', lang)
@@ -194,8 +232,7 @@ class UIComponents:
         asset_names = get_asset_names(lang)
         
         # Initialize edit mode if it doesn't exist
-        if 'edit_mode' not in st.session_state:
-            st.session_state.edit_mode = {}
+        edit_mode = st.session_state.setdefault('edit_mode', {})
         
         # CRITICAL FIX: Use profile name in key to force widget recreation when profile changes
         profile_key = st.session_state.get(f'last_selected_{phase}_profile', 'default')
@@ -238,11 +275,10 @@ class UIComponents:
                     )
                 
                 # Edit button for other parameters
-                if edit_key not in st.session_state.edit_mode:
-                    st.session_state.edit_mode[edit_key] = False
+                edit_mode.setdefault(edit_key, False)
                 
                 if st.button(get_text('edit_parameters', lang), key=f"edit_btn_{phase}_{i}"):
-                    st.session_state.edit_mode[edit_key] = not st.session_state.edit_mode[edit_key]
+                    edit_mode[edit_key] = not edit_mode[edit_key]
                 
                 # Fields editable only in edit mode
                 ret = asset['return']
@@ -250,7 +286,7 @@ class UIComponents:
                 min_ret = asset['min_return']
                 max_ret = asset['max_return']
                 
-                if st.session_state.edit_mode[edit_key]:
+                if edit_mode[edit_key]:
                     st.markdown(get_text('advanced_parameters', lang))
                     col_c, col_d = st.columns(2)
                     
@@ -340,8 +376,8 @@ class UIComponents:
             return True
     
     @staticmethod
-    def render_allocation_chart(assets_data, lang, phase='accumulation'):
-        """Render allocation pie chart for specific phase with unique key"""
+    def render_allocation_chart(assets_data, lang, phase='accumulation', total_allocation=None):
+        """Render allocation pie chart for specific phase with unique key (total is summed if not given)"""
         if phase == 'accumulation':
             title = get_text('accumulation_chart', lang)
         else:
@@ -351,20 +387,15 @@ class UIComponents:
         
         # Filter only assets with allocation > 0 for the chart
         active_assets = [asset for asset in assets_data if asset['allocation'] > 0]
-        total_allocation = sum(asset['allocation'] for asset in assets_data)
+        if total_allocation is None:
+            total_allocation = sum(asset['allocation'] for asset in assets_data)
         
         if abs(total_allocation - 100.0) <= 0.01 and active_assets:
-            df_alloc = pd.DataFrame([
-                {'Asset': asset['display_name'], 'Allocation': asset['allocation']}
-                for asset in active_assets
-            ])
-            fig_pie = px.pie(
-                df_alloc, 
-                values='Allocation', 
-                names='Asset', 
-                title=get_text('portfolio_distribution', lang)
+            fig_pie = _build_allocation_pie(
+                tuple(asset['display_name'] for asset in active_assets),
+                tuple(asset['allocation'] for asset in active_assets),
+                get_text('portfolio_distribution', lang)
             )
-            fig_pie.update_layout(height=400)
             # Add unique key based on phase to avoid duplicate ID error
             st.plotly_chart(fig_pie, use_container_width=True, key=f"pie_chart_{phase}")
         else:
@@ -381,21 +412,23 @@ class UIComponents:
         st.subheader(title)
         
         # Show only assets with allocation > 0 in the summary table
-        active_assets_df = pd.DataFrame([asset for asset in assets_data if asset['allocation'] > 0])
+        active_assets = [asset for asset in assets_data if asset['allocation'] > 0]
         
-        if not active_assets_df.empty:
+        if active_assets:
             # Show only asset name and allocation
-            summary_df = active_assets_df[['display_name', 'allocation']].copy()
-            # Rename columns for display
-            summary_df.columns = ['Asset', get_text('allocation_percent', lang)]
+            summary_df = _build_summary_frame(
+                tuple(asset['display_name'] for asset in active_assets),
+                tuple(asset['allocation'] for asset in active_assets),
+                get_text('allocation_percent', lang)
+            )
             st.dataframe(summary_df, use_container_width=True)
         else:
             st.info(get_text('no_active_assets', lang))
     
     @staticmethod
     def render_run_simulation_button(lang):
-        """Render run simulation button"""
-        return st.button(get_text('run_simulation', lang), type="primary")
+        """Render run simulation button (inside the parameters form, so a run also applies it)"""
+        return st.form_submit_button(get_text('run_simulation', lang), type="primary")
     
     @staticmethod
     def render_footer(lang):